@@ -0,0 +1,202 @@
+"""
+    benchmark.py
+    Created by Floris P.J. den Hartog, 2018
+
+    End-to-end throughput benchmark on the simulated Arduino (see simulator.py), no hardware needed
+    Reports the sustained samples/sec, drop rate and time per stage (parse, save, convert, draw, see metrics.py),
+    every run is appended to benchmarks/results.csv and compared with the previous run of the same configuration
+
+    Usage: python benchmark.py [--freq 100] [--pins 6] [--binary] [--faults 0.01] [--unit 4] [--seconds 10] [--gui]
+      Without --gui the live graph of main.py (see live.py) is drawn without a window (matplotlib Agg)
+      With --gui main.FSR itself is driven (needs a display, e.g. run it with xvfb-run on a server)
+"""
+
+import os, time, argparse, csv, subprocess, tempfile
+
+import calculations, buffers, reader, writer, recording, logger, protocol, simulator, metrics, recorder, live
+
+VCC = 5.06
+PULLDOWN = 10000
+BUFFER_SIZE = 10000
+RESULTS = "benchmarks/results.csv"
+COLUMNS = ["date", "commit", "mode", "freq", "pins", "binary", "faults", "refresh_ms", "cutoff", "unit", "mavg", "seconds", "expected/s", \
+           "samples/s", "drop rate", "faulty", "gaps", "parse (ms/s)", "save (ms/s)", "convert (ms/s)", "draw (ms/s)", "draw (ms/frame)"]
+CONFIG = ["mode", "freq", "pins", "binary", "faults", "refresh_ms", "cutoff", "unit", "mavg"] # Runs with the same values are compared
+
+# The poll loop of main.FSR without Tk: the same live graph (see live.py), drawn on a matplotlib Agg canvas
+def run_headless(args):
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    calc = calculations.calculations(VCC, PULLDOWN)
+    directory = tempfile.mkdtemp(prefix="fsr_benchmark_")
+    log = logger.logger(os.path.join(directory, "log.txt"), time.time(), level=logger.ERROR)
+
+    ser = simulator.simulatedSerial(args.freq, args.pins, faults=args.faults, seed=1, timeout=1)
+    initialized, binary, pins = recorder.handshake(ser, log, args.binary)
+    if not initialized:
+        raise RuntimeError("No INIT_COMPLETE from the simulated Arduino")
+
+    if not binary:
+        time.sleep(protocol.MODE_TIMEOUT) # The Arduino only starts measuring after the binary request window, don't count that
+
+    rings = [buffers.sampleRing(BUFFER_SIZE) for pin in range(args.pins)]
+    out = recording.recordingWriter(os.path.join(directory, "data.fsr"), VCC, PULLDOWN, args.freq, 0) if binary else \
+          writer.dataWriter(os.path.join(directory, "data.txt"))
+
+    fig = plt.figure()
+    ax = fig.add_subplot(111)
+    ax.set_autoscale_on(False)
+
+    graph = live.liveGraph(fig.canvas, ax)
+    graph.set_channels([ax.plot([], [], animated=True)[0] for pin in range(args.pins)], [str(pin) for pin in range(args.pins)])
+    graph.reset(calc, args.cutoff, args.mavg)
+    pins = list(range(args.pins))
+
+    loop = metrics.loopMetrics(args.pins, 1000 / args.freq)
+    serial_reader = reader.serialReader(ser, rings, log, binary=binary)
+    serial_reader.start()
+
+    end = time.perf_counter() + args.seconds
+    while time.perf_counter() < end:
+        time.sleep(args.refresh_ms / 1000)
+
+        graph.ingest(rings, loop, log, args.unit, pins, pins, out)
+
+        with loop.timer("draw"):
+            graph.draw(pins)
+
+    summary = loop.summary([serial_reader], rings)
+
+    serial_reader.stop()
+    serial_reader.join()
+    out.close()
+    log.close()
+    plt.close(fig)
+
+    return summary
+
+# Drive main.FSR itself on the simulated Arduino
+def run_gui(args):
+    import main
+
+    fsr = main.FSR()
+    fsr.MEASURE_FRQ = args.freq
+    fsr.COM_PORT.set("SIM:freq=%i,pins=%i,faults=%g,seed=1" % (args.freq, args.pins, args.faults))
+    fsr.BINARY.set(1 if args.binary else 0)
+    fsr.REC_FORMAT.set("Binary" if args.binary else "Text")
+    fsr.REFRESH_MS.set(args.refresh_ms)
+    fsr.POP_CUTOFF.set(args.cutoff)
+    fsr.cutoff_change(args.cutoff)
+    fsr.MAVG_N.set(args.mavg)
+    fsr.y_unit.set(live.UNITS[args.unit])
+    fsr.y_unit_change(live.UNITS[args.unit])
+
+    for pin in range(fsr.NUM_CHANNELS):
+        fsr.sensor_display_vars[pin].set(1 if pin < args.pins else 0)
+        fsr.sensor_record_vars[pin].set(1 if pin < args.pins else 0)
+
+    fsr.toggle_sensor_display()
+    fsr.toggle_sensor_record()
+
+    summary = {}
+
+    def stop():
+        if fsr.recording and fsr.metrics is not None:
+            summary.update(fsr.metrics.summary(fsr.serial_readers, fsr.rings))
+
+        fsr.rec_stop()
+        fsr.root.quit()
+
+    fsr.root.after(0, fsr.rec_start)
+    fsr.root.after(int(args.seconds * 1000) + int(protocol.MODE_TIMEOUT * 1000), stop)
+    fsr.root.mainloop()
+    fsr.root.destroy()
+
+    if len(summary) == 0:
+        raise RuntimeError("Recording on the simulated Arduino did not start, see the log")
+
+    return summary
+
+def commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return ""
+
+def previous(row):
+    if not os.path.exists(RESULTS):
+        return None
+
+    with open(RESULTS, newline="") as f:
+        rows = [r for r in csv.DictReader(f) if all(r.get(key) == str(row[key]) for key in CONFIG)]
+
+    return rows[-1] if len(rows) > 0 else None
+
+def save(row):
+    os.makedirs(os.path.dirname(RESULTS), exist_ok=True)
+    rows = [] # Results of an older version of the benchmark, rewritten with the new columns (empty)
+    new = not os.path.exists(RESULTS)
+
+    if not new:
+        with open(RESULTS, newline="") as f:
+            r = csv.DictReader(f)
+            if r.fieldnames != COLUMNS:
+                rows = list(r)
+                new = True
+
+    with open(RESULTS, "w" if new else "a", newline="") as f:
+        w = csv.DictWriter(f, fieldnames=COLUMNS, restval="", extrasaction="ignore")
+        if new:
+            w.writeheader()
+
+        w.writerows(rows + [row])
+
+def report(row, prev):
+    print("%s, %i Hz x %i pins, %s, faults %g, refresh %i ms, cutoff %i, %s (mavg %i), %.1f s (commit %s)" % \
+          (row["mode"], row["freq"], row["pins"], "binary" if row["binary"] else "text", row["faults"], row["refresh_ms"], \
+           row["cutoff"], live.UNITS[row["unit"]], row["mavg"], row["seconds"], row["commit"] or "?"))
+
+    for key in COLUMNS[COLUMNS.index("expected/s"):]:
+        line = "  %-16s %10.4g" % (key, row[key])
+
+        if prev is not None and prev.get(key, "") != "":
+            old = float(prev[key])
+            change = (row[key] - old) / old * 100 if old != 0 else 0.0
+            line += "   (previous %.4g, %+.1f%%)" % (old, change)
+
+        print(line)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Throughput benchmark on the simulated Arduino")
+    parser.add_argument("--freq", type=int, default=100, help="measurements per second per pin (default: 100)")
+    parser.add_argument("--pins", type=int, default=6, help="number of pins (default: 6)")
+    parser.add_argument("--binary", action="store_true", help="use the binary serial protocol")
+    parser.add_argument("--faults", type=float, default=0.0, help="fraction of corrupted lines (default: 0)")
+    parser.add_argument("--refresh-ms", type=int, default=500, help="graph refresh rate (default: 500, as in main.py)")
+    parser.add_argument("--cutoff", type=int, default=1000, help="samples in the graph per pin (default: 1000, as in main.py)")
+    parser.add_argument("--unit", type=int, default=live.OPT_RAW, choices=range(len(live.UNITS)), \
+                        help="y-axis unit, 0-%i in the order of main.py (default: 0, raw values)" % (len(live.UNITS) - 1))
+    parser.add_argument("--mavg", type=int, default=10, help="moving average window (default: 10, as in main.py)")
+    parser.add_argument("--seconds", type=float, default=10, help="duration (default: 10)")
+    parser.add_argument("--gui", action="store_true", help="drive main.FSR (needs a display)")
+    parser.add_argument("--no-save", action="store_true", help="don't append the result to %s" % RESULTS)
+    args = parser.parse_args()
+
+    summary = run_gui(args) if args.gui else run_headless(args)
+
+    row = {"date": time.strftime("%Y-%m-%d %H:%M:%S"), "commit": commit(), "mode": "gui" if args.gui else "headless", \
+           "freq": args.freq, "pins": args.pins, "binary": int(args.binary), "faults": args.faults, "refresh_ms": args.refresh_ms, \
+           "cutoff": args.cutoff, "unit": args.unit, "mavg": args.mavg, "seconds": round(summary["seconds"], 2), "expected/s": args.freq * args.pins, \
+           "samples/s": round(summary["samples/s"], 2), "drop rate": round(summary["drop rate"], 6), "faulty": summary["faulty"], \
+           "gaps": summary["gaps"], "draw (ms/frame)": round(summary["draw_call"], 3)}
+
+    for stage in metrics.loopMetrics.STAGES:
+        row["%s (ms/s)" % stage] = round(summary["stages"][stage], 3)
+
+    prev = previous(row)
+    report(row, prev)
+
+    if not args.no_save:
+        save(row)
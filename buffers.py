@@ -0,0 +1,136 @@
+"""
+    buffers.py
+    Created by Floris P.J. den Hartog, 2018
+
+    Preallocated buffers used to pass sensor data between the serial reader and the GUI
+"""
+
+import threading
+import numpy as np
+
+class sampleRing:
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.times = np.zeros(capacity, dtype=np.int64)
+        self.values = np.zeros(capacity, dtype=np.int16)
+
+        self.head = 0 # Total amount of samples ever written
+        self.tail = 0 # Total amount of samples ever read
+        self.dropped = 0 # Samples overwritten before the GUI could read them
+
+        self.lock = threading.Lock()
+
+    # Called from the reader thread, overwrites the oldest samples if the GUI can't keep up
+    def push(self, timestamp, value):
+        with self.lock:
+            self.times[self.head % self.capacity] = timestamp
+            self.values[self.head % self.capacity] = value
+            self.head += 1
+
+            if (self.head - self.tail) > self.capacity:
+                self.dropped += (self.head - self.tail) - self.capacity
+                self.tail = self.head - self.capacity
+
+    # Same as push, for a batch of samples
+    def push_many(self, timestamps, values):
+        n = min(len(timestamps), self.capacity)
+        overflow = len(timestamps) - n
+        timestamps, values = timestamps[overflow:], values[overflow:]
+
+        with self.lock:
+            self.dropped += overflow
+            idx = (self.head + np.arange(0, n)) % self.capacity
+            self.times[idx] = timestamps
+            self.values[idx] = values
+            self.head += n
+
+            if (self.head - self.tail) > self.capacity:
+                self.dropped += (self.head - self.tail) - self.capacity
+                self.tail = self.head - self.capacity
+
+    # Called from the GUI, returns (copies of) all samples received since the last call
+    def pull(self):
+        with self.lock:
+            n = self.head - self.tail
+            start = self.tail % self.capacity
+            idx = (np.arange(start, start + n) % self.capacity) if (start + n) > self.capacity else slice(start, start + n)
+
+            times = self.times[idx].copy()
+            values = self.values[idx].copy()
+            self.tail = self.head
+
+        return times, values
+
+    def clear(self):
+        with self.lock:
+            self.tail = self.head
+
+    def __len__(self):
+        return self.head - self.tail
+
+class windowBuffer:
+    def __init__(self, capacity):
+        self.allocate(capacity)
+
+    # Every sample is stored twice (at i and i + capacity), so the last `capacity` samples are always contiguous
+    def allocate(self, capacity):
+        self.capacity = capacity
+        self.head = 0 # Total amount of samples ever written
+
+        self._times = np.zeros(2 * capacity, dtype=np.float64)
+        self._raw = np.zeros(2 * capacity, dtype=np.int64)
+        self._data = np.zeros(2 * capacity, dtype=np.float64)
+
+    def __len__(self):
+        return min(self.head, self.capacity)
+
+    def window(self):
+        n = len(self)
+        start = (self.head - n) % self.capacity
+
+        return slice(start, start + n)
+
+    # Ordered views (no copies) of the samples in the window, oldest first
+    @property
+    def times(self):
+        return self._times[self.window()]
+
+    @property
+    def raw(self):
+        return self._raw[self.window()]
+
+    @property
+    def data(self):
+        return self._data[self.window()]
+
+    # Append a batch of samples, returns the raw values that dropped out of the window
+    def extend(self, times, raw, data):
+        k = len(times)
+        evicted = self.raw[:max(0, len(self) + k - self.capacity)].copy()
+
+        if k > self.capacity: # Only the newest samples fit
+            times, raw, data = times[-self.capacity:], raw[-self.capacity:], data[-self.capacity:]
+            self.head += k - self.capacity
+            k = self.capacity
+
+        idx = (self.head + np.arange(0, k)) % self.capacity
+        for arr, new in ((self._times, times), (self._raw, raw), (self._data, data)):
+            arr[idx] = new
+            arr[idx + self.capacity] = new
+
+        self.head += k
+
+        return evicted
+
+    def clear(self):
+        self.head = 0
+
+    # Change the capacity, keeping the newest samples
+    def resize(self, capacity):
+        if capacity == self.capacity:
+            return
+
+        times, raw, data = self.times.copy(), self.raw.copy(), self.data.copy()
+
+        self.allocate(capacity)
+        self.extend(times, raw, data)
@@ -5,11 +5,44 @@
     File for calculations with raw FSR data, based on FSR specs/laws of physics
 """
 
+import numpy as np
+
+# Lookup tables per (Vcc, pulldown), shared between all calculations instances
+TABLES = {}
+
 class calculations:
     def __init__(self, Vcc, pulldown):
         self.Vcc = Vcc
         self.pulldown = pulldown
 
+        # The ADC only gives 2^10 different values, so every conversion can be looked up
+        if not (Vcc, pulldown) in TABLES:
+            TABLES[(Vcc, pulldown)] = self.compute(np.arange(0, 2**10))
+
+        self.tables = TABLES[(Vcc, pulldown)]
+
+    # Convert an array of readouts to "vals", "volts", "resists" (Ohm), "conds" (S) or "newtons"
+    def convert(self, vals, unit):
+        vals = np.asarray(vals)
+
+        if vals.dtype.kind in "iu":
+            return self.tables[unit][np.clip(vals, 0, 2**10 - 1)]
+
+        # Non-integer readouts (e.g. averages) can't be looked up
+        return self.compute(vals)[unit]
+
+    # Vectorized version of the functions below, 0 wherever they would return 0
+    def compute(self, vals):
+        vals = np.asarray(vals)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            volts = np.where(vals > 0, vals * (self.Vcc / (2**10 - 1)), 0.0)
+            resists = np.where(volts > 0, self.pulldown * ((self.Vcc / volts) - 1), 0.0)
+            conds = np.where(resists > 0, 1 / resists, 0.0)
+            newtons = np.where(resists > 0, (96892 * (resists**-1.292)) * 9.8066500286389, 0.0)
+
+        return {"vals": vals, "volts": volts, "resists": resists, "conds": conds, "newtons": newtons}
+
     def val_to_volt(self, val):
         return val * (self.Vcc / (2**10 - 1)) if val > 0 else 0
 
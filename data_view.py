@@ -6,9 +6,11 @@ import numpy as np
 from scipy import signal
 from scipy.stats import *
 from math import sqrt, floor
+import os, json, argparse
+from concurrent.futures import ProcessPoolExecutor
 
 from data_input import trials
-wires = []
+import pipeline, significance, rolling, lod
 stats = []
 
 ##
@@ -19,386 +21,312 @@ display_type = "raw"
 run_stats = True
 show_pvals = False
 show_bands = False
+PVAL_WINDOW = 600 # Test per window of x datapoints (10 = 1 sec, 600 = 1 min), 1 to test every datapoint
+PVAL_AGGREGATE = "sample" # Summary of a window per trial: "sample" (the one after the window starts) or a NumPy function, e.g. "median"
+PVAL_CORRECTION = None # Multiple comparison correction: None, "bonferroni" or "bh" (Benjamini-Hochberg)
+ALPHA = 0.05
+SMOOTH = "causal" # Smoothing of the medians and bands: "causal", "centered", "filtfilt" or "savgol" (see rolling.smooth)
+SMOOTH_N = 5000 # Smoothing window (datapoints)
 stats.append((0, len(trials) // 2))
 stats.append((len(trials) // 2, len(trials)))
+STATS_LABELS = ["Small bites (5x5)", "Large bites (10x10)"]
+STATS_COLORS = ["red", "blue"]
+##
+TITLE = "Suture tension over 30 mins at 20 mmHg IAP in six porcine abdominal walls\n"
+Y_LABEL = "Change in force (N)"
+X_LIM = (0, 30 * 60 * 1000)
 ##
 FREQ = 10 # Measuring frequency
-SHOW_EVERY = 1 # Show only every x measurements
+SHOW_EVERY = 1 # Use only every x measurements (plots are decimated to the screen resolution anyway, see lod.py)
 GAP_THRESHOLD = 2000 # delete gaps greater than x msec (likely artefacts, see Figures/Data_artefacts
-MAVG_WIND = 1000 # Msec window for moving average (50 * 20 = 1 sec)
+GAP_REPORTS = "sensordata/gaps" # A report of the removed gaps is written here per trial, None to disable
+MAVG_WIND = [1000] # Windows (datapoints) for the moving averages, one line per window
+VCC = 5.06 # Vcc and pulldown used during the recordings
+PULLDOWN = 10000
+CACHE_DIR = "sensordata/.cache" # Parsed recordings are kept here between runs, None to disable
+WORKERS = None # Processes for the trials, None for one per core, 1 to process them in this process
 ##
 
-raws = []
-
-fig = None
-art = []
-for fn, wire, baseline, sensor in trials:
-    __start__ = millis()
-    wires.append(wire)
-
-    f = open("sensordata/%s.txt" % fn.replace("annotations", "data"))
-    data_lines = f.readlines()
-
-    try:
-        f = open("sensordata/%s.txt" % fn.replace("data", "annotations"))
-        annot_lines = f.readlines()
-    except FileNotFoundError:
-        annot_lines = []
-
-    # Get data + convert to val/volt/resist
-    ts = []
-    vals = []
-    volts = []
-    resists = []
-    newtons = []
-    i = 0
-    for l in data_lines:
-        i += 1
-        
-        if l[0] != ";":
-            tmp = l.rstrip().split(",")
-
-            if len(tmp) == 3:
-                try:
-                    t = int(tmp[0])
-                    s = int(tmp[1])
-                    v = int(tmp[2])
-                except ValueError:
-                    continue
-
-                # s + 1 to prevent confusion (sensor 1 = 0, sensor 2 = 1, etc.)
-                if (s + 1) != sensor:
-                    continue
-
-                if v > 1023:
-                    print("Off: %i at %i in %s" % (v, t, fn))
-
-                if v > 0:
-                    voltage = (v * (5.06 / 1023))
-                    r = 10000 * ((5.06 / voltage) - 1)
-                    n = (96892 * (r**-1.292)) * 9.8066500286389
-                    
-                    ts.append(t)
-                    vals.append(v)
-                    volts.append(voltage)
-                    resists.append(r)
-                    newtons.append(n)
-                else:
-                    ts.append(t)
-                    vals.append(0)
-                    volts.append(0)
-                    resists.append(None)
-                    newtons.append(None)
-
-    # Get base tension
-    base = None
-    for i, t in enumerate(ts):
-        if t >= baseline:
-            base = i
-            break
-
-    # Remove gaps
-    gaps = []
-
-    for i, t in enumerate(ts):
-        if i > 1:
-            d = abs(ts[i] - ts[i - 1])
-            
-            if d > GAP_THRESHOLD:
-                print("%i - %i = %i" % (ts[i], ts[i - 1], d))
-                gaps.append(ts[i])
-                gaps.append(ts[i - 1])
-
-    for t in gaps:
-        try:
-            i = ts.index(t)
-        except ValueError:
-            continue
-        
-        ts.pop(i)
-        vals.pop(i)
-        volts.pop(i)
-        resists.pop(i)
-        newtons.pop(i)
-
-    # Averages
-    vals_avg = [None]
-    volts_avg = [None]
-    resists_avg = [None]
-    newtons_avg = [None]
-    sum_ = 0
-
-    for i, val in enumerate(vals):
-        if i > 0:
-            sum_ += val
-
-            vals_avg.append(sum_ / i)
-
-            if sum_ > 0:
-                voltage = ((sum_ / i) * (5.06 / 1023))
-                r = 10000 * ((5.06 / voltage) - 1)
-                n = (96892 * (r**-1.292)) * 9.8066500286389
-
-                volts_avg.append(voltage)
-                resists_avg.append(r)
-                newtons_avg.append(n)
-
-    # Moving average
-    N = MAVG_WIND # mavg window
-    vals_mavg = [None for i in range(N)]
-    volts_mavg = [None for i in range(N)]
-    resists_mavg = [None for i in range(N)]
-    newtons_mavg = [None for i in range(N)]
-    sum_ = [0]
-
-    for i, val in enumerate(vals):
-        if i > 0:
-            sum_.append(sum_[i - 1] + val)
-
-            if i >= N:
-                vals_mavg.append((sum_[i] - sum_[i - N]) / N)
-                
-                if (sum_[i - 1] + val) > 0:
-                    voltage = (((sum_[i] - sum_[i - N]) / N) * (5.06 / 1023))
-                    r = 10000 * ((5.06 / voltage) - 1) if voltage > 0 else 0
-                    n = (96892 * (r**-1.292)) * 9.8066500286389 if voltage > 0 else 0
-
-                    volts_mavg.append(voltage)
-                    resists_mavg.append(r)
-                    newtons_mavg.append(n)
-
-    raw = eval("%s" % to_show)
-    avg = eval("%s_avg" % to_show)
-    mavg = eval("%s_mavg" % to_show)
-
-    if len(ts) < len(avg):
-        avg = avg[:len(ts)]
-    elif len(ts) > len(avg):
-        ts = ts[:len(avg)]
-
-    if len(ts) < len(mavg):
-        mavg = mavg[:len(ts)]
-    elif len(ts) > len(mavg):
-        ts = ts[:len(mavg)]
-
-    raw = raw[:len(ts)]
+# The options above as an analysis config, a JSON config (see analyses/example.json) can override any of these keys
+def default_config():
+    return {"name": "data_view", "trials": trials, "stats": stats, "labels": STATS_LABELS, "colors": STATS_COLORS, \
+        "plot_annot": plot_annot, "to_show": to_show, "display_type": display_type, "run_stats": run_stats, \
+        "show_pvals": show_pvals, "show_bands": show_bands, "pval_window": PVAL_WINDOW, "pval_aggregate": PVAL_AGGREGATE, \
+        "pval_correction": PVAL_CORRECTION, "alpha": ALPHA, "smooth": SMOOTH, "smooth_n": SMOOTH_N, "title": TITLE, \
+        "y_label": Y_LABEL, "x_lim": X_LIM, "show_every": SHOW_EVERY, "gap_threshold": GAP_THRESHOLD, \
+        "gap_reports": GAP_REPORTS, "mavg_wind": MAVG_WIND, "Vcc": VCC, "pulldown": PULLDOWN, "cache_dir": CACHE_DIR}
+
+def load_config(file):
+    config = default_config()
+    config["name"] = os.path.splitext(os.path.basename(file))[0]
+
+    with open(file) as f:
+        loaded = json.load(f)
+
+    unknown = set(loaded.keys()) - set(config.keys())
+    if len(unknown) > 0:
+        raise ValueError("%s: unknown option(s) %s" % (file, ", ".join(sorted(unknown))))
+
+    config.update(loaded)
+    config["trials"] = [tuple(trial) for trial in config["trials"]]
+
+    return config
+
+# Process the trials of an analysis (pipeline.trialTable per trial), results are kept in memo so analyses with the same trials
+# and settings share them, whatever unit they show
+def process(config, workers=None, pool=None, memo=None):
+    settings = {key: config[key] for key in ("show_every", "gap_threshold", "gap_reports", "Vcc", "pulldown", "cache_dir")}
+    key = json.dumps([config["trials"], settings], sort_keys=True)
+
+    if memo is not None and key in memo:
+        return memo[key]
+
+    results = pipeline.process_all(config["trials"], settings, workers, pool)
+
+    if memo is not None:
+        memo[key] = results
+
+    return results
+
+# Statistics per group of trials (median, mean, quartile bands) and the rank-sum test between the first two groups
+def statistics(config, results):
+    out = {"times": [], "averages": [], "medians": [], "confidence": [], "subsets": [], "pval_times": [], "pvals": [], "sig_spans": []}
+
+    if not config["run_stats"]:
+        return out
+
+    ts = results[-1].ts
+    raws = [result.raw(config["to_show"]) for result in results]
+
+    for a, b in config["stats"]:
+        # One row per trial, cut to the shortest trial
+        L = min([len(r) for r in raws[a:b]])
+        subset = np.vstack([r[0:L] for r in raws[a:b]])
+        print(len(subset))
+        time = ts[0:L]
+
+        subset_avg = np.mean(subset, axis=0)
+        subset_med = np.median(subset, axis=0)
+
+        if config["show_bands"]:
+            ci_subset_lower, ci_subset_upper = np.percentile(subset, [25, 75], axis=0)
+
+            #subset_sem = np.std(subset, axis=0) / sqrt(len(subset))
+            #ci_subset_upper = subset_avg + (1.96 * subset_sem)
+            #ci_subset_lower = subset_avg - (1.96 * subset_sem)
+
+            out["confidence"].append((ci_subset_lower, ci_subset_upper))
+
+        out["subsets"].append(subset)
+        out["times"].append(time)
+        out["averages"].append(subset_avg)
+        out["medians"].append(subset_med)
+
+    # Rank-sum test between both groups, per window
+    if len(out["subsets"]) >= 2:
+        out["pval_times"], out["pvals"], out["sig_spans"] = significance.test(out["subsets"][0], out["subsets"][1], out["times"][0], \
+            config["pval_window"], significance.aggregator(config["pval_aggregate"]), config["pval_correction"], config["alpha"])
+        print(len(out["pvals"]))
+
+    return out
+
+def plot(config, results, stat):
+    fig, ax = plt.subplots()
 
     # Format tickers
     def the_time(x, pos):
-        global SHOW_EVERY
-        return timerunning(x / 1000 * SHOW_EVERY)
-
-    formatter = FuncFormatter(the_time)
-
-    # Plot data
-    if fig is None:
-        fig, ax = plt.subplots()
-        
-    ax.xaxis.set_major_formatter(formatter)
-    
-    # Normalizing & drawing data
-    col = "blue" if wire.find("PDS L") > -1 else "red"
-    filter_n = 25
-    a = None
-
-    if display_type == "raw":
-        # For relative measurements
-        for i, r in enumerate(raw):
-            if r is None:
-                raw[i] = 0
-        
-        raw = [r - raw[base] for r in raw]
-
-        #a, = ax.plot(ts[base::SHOW_EVERY], raw[base::SHOW_EVERY], col)
-        #a, = ax.plot(ts[base::SHOW_EVERY], signal.lfilter([1.0 / filter_n] * filter_n, 1, raw[base::SHOW_EVERY]), col)
-        raws.append(np.array(raw[base::SHOW_EVERY]))
-    elif display_type == "avg":
-        avg[1:] = [a - avg[base] for a in avg[1:]]
-        a, = ax.plot(ts, avg, col)
-    elif display_type == "mavg":
-        mavg = [m - mavg[base] for m in mavg]
-        a, = ax.plot(ts, mavg, col)
-
-    art.append(a)
-    nots = []
-    msgs = []
-
-    # Plot annotations
-    if (len(annot_lines) > 0) and plot_annot:
-        for l in annot_lines:
-            t, msg = l.split(",")
-
-            nots.append(ax.axvline(x=int(t), color=a.get_color(), linewidth=1, linestyle="dashed"))
-            msgs.append(ax.text(int(t), 0, " %s" % msg, fontsize=16))
-
-    # Bind hover event for annotations
-    def hover(e):
-        global __start__
-        
-        if ((millis() - __start__) < 50):
-            return
-        else:
-            __start__ = millis()
-        
-        c = False
-        
-        for line in nots:
-            if line.get_linestyle() != "dashed":
-                line.set_linestyle("dashed")
-                line.set_linewidth(1)
-                c = True
-
-            if e.inaxes == ax:
-                cont, ind = line.contains(e)
-
-                if cont:
-                    line.set_linestyle("solid")
-                    line.set_linewidth(2)
-                    c = True
+        return timerunning(x / 1000)
 
-        if c:
-            fig.canvas.draw_idle()
+    ax.xaxis.set_major_formatter(FuncFormatter(the_time))
+
+    for result in results:
+        __start__ = millis()
+        wire = result.wire
+        ts = result.ts
+        annot_lines = result.annotations
+
+        # Drawing data
+        col = "blue" if wire.find("PDS L") > -1 else "red"
+        filter_n = 25
+        a = None
 
-    def scroll(e):
-        dir_ = e.button
-        xlim = ax.get_xlim()
-        xwidth = xlim[1] - xlim[0]
-        xstep = round(xwidth * 0.01)
+        if config["display_type"] == "raw":
+            #a = lod.plot(ax, ts, result.raw(config["to_show"]), col)
+            #a, = ax.plot(ts, signal.lfilter([1.0 / filter_n] * filter_n, 1, result.raw(config["to_show"])), col)
+            pass
+        elif config["display_type"] == "avg":
+            a = lod.plot(ax, ts, result.avg(config["to_show"]), col)
+        elif config["display_type"] == "mavg":
+            for m in result.mavg(config["to_show"], config["mavg_wind"]):
+                a = lod.plot(ax, ts, m, col)
 
-        if dir_ == "up":
-            ax.set_xlim(left=xlim[0] + xstep, right=xlim[1] + xstep)
-        elif dir_ == "down":
-            ax.set_xlim(left=xlim[0] - xstep, right=xlim[1] - xstep)
+        nots = []
+        msgs = []
 
         # Plot annotations
-        if len(annot_lines) > 0:
-            i = 0
+        if (len(annot_lines) > 0) and config["plot_annot"]:
             for l in annot_lines:
                 t, msg = l.split(",")
 
-                msgs[i].remove()
-                msgs[i] = ax.text(int(t), ax.get_ylim()[0], " %s" % msg, fontsize=16)
-                #del msgs[i]
-
-                i += 1
-
-        fig.canvas.draw_idle()
-        
-    #fig.canvas.mpl_connect("motion_notify_event", hover)
-    fig.canvas.mpl_connect("scroll_event", scroll)
-
-if run_stats:
-    # Statistics
-    averages = []
-    medians = []
-    times = []
-    confidence = []
-    all_datas = []
-
-    for a, b in stats:
-        subset_raws = raws[a:b]
-        print(len(subset_raws))
-        L = min([len(r) for r in subset_raws])
-        time = ts[0:L]
-        subset_raws = [r[0:L] for r in subset_raws]
-
-        all_data = [[] for i in range(L)]
-        for i, line in enumerate(subset_raws):
-            for j, point in enumerate(line):
-                all_data[j].append(point)
-
-        subset_avg = [np.mean(np.array(a)) for a in all_data]
-        subset_med = [np.median(np.array(a)) for a in all_data]
-
-        if show_bands:
-            ci_subset_upper = [np.percentile(np.array(a), 75) for a in all_data]
-            ci_subset_lower = [np.percentile(np.array(a), 25) for a in all_data]
-            
-            #subset_std = [np.std(np.array(a)) for a in all_data]
-            #subset_sem = [std / sqrt(len(subset_raws)) for std in subset_std]
-            #ci_subset_upper = [subset_avg[i] + (1.96 * subset_sem[i]) for i in range(len(subset_avg))]
-            #ci_subset_lower = [subset_avg[i] - (1.96 * subset_sem[i]) for i in range(len(subset_avg))]
-
-            confidence.append((ci_subset_lower, ci_subset_upper))
-
-        all_datas.append(all_data)
-        times.append(time)
-        averages.append(subset_avg)
-        medians.append(subset_med)
-
-    # Voor elk meetpunt -> test doen
-    pvals = []
-    pval_times = []
-
-    L = min([len(all_datas[0]), len(all_datas[1])])
-    PVAL_EVERY = 600 # 10 = 1 sec, 600 = 1 min
-    for i in range(0, floor(L / PVAL_EVERY)):
-        try:
-            a = all_datas[0][i * PVAL_EVERY + 1]
-            b = all_datas[1][i * PVAL_EVERY + 1]
-            stat, pval = ranksums(a, b)
-            pvals.append(pval)
-            pval_times.append(times[0][i * PVAL_EVERY + 1])
-
-            #print("Median %i, series 0: %.4f" % (i, np.median(np.array(a))))
-            #print(" - 25th pct: %.4f; 75th pct: %.4f" % (np.percentile(np.array(a), 25), np.percentile(np.array(a), 75)))
-            #print("Median %i, series 1: %.4f" % (i, np.median(np.array(b))))
-            #print(" - 25th pct: %.4f; 75th pct: %.4f" % (np.percentile(np.array(b), 25), np.percentile(np.array(b), 75)))
-
-        except ValueError:
-            pass
+                nots.append(ax.axvline(x=int(t) - result.start, color=a.get_color(), linewidth=1, linestyle="dashed"))
+                msgs.append(ax.text(int(t) - result.start, 0, " %s" % msg, fontsize=16))
+
+        # Bind hover event for annotations
+        def hover(e):
+            nonlocal __start__
+
+            if ((millis() - __start__) < 50):
+                return
+            else:
+                __start__ = millis()
+
+            c = False
+
+            for line in nots:
+                if line.get_linestyle() != "dashed":
+                    line.set_linestyle("dashed")
+                    line.set_linewidth(1)
+                    c = True
+
+                if e.inaxes == ax:
+                    cont, ind = line.contains(e)
+
+                    if cont:
+                        line.set_linestyle("solid")
+                        line.set_linewidth(2)
+                        c = True
+
+            if c:
+                fig.canvas.draw_idle()
+
+        def scroll(e):
+            dir_ = e.button
+            xlim = ax.get_xlim()
+            xwidth = xlim[1] - xlim[0]
+            xstep = round(xwidth * 0.01)
+
+            if dir_ == "up":
+                ax.set_xlim(left=xlim[0] + xstep, right=xlim[1] + xstep)
+            elif dir_ == "down":
+                ax.set_xlim(left=xlim[0] - xstep, right=xlim[1] - xstep)
+
+            # Plot annotations
+            if len(annot_lines) > 0:
+                i = 0
+                for l in annot_lines:
+                    t, msg = l.split(",")
 
-    print(len(pvals))
+                    msgs[i].remove()
+                    msgs[i] = ax.text(int(t) - result.start, ax.get_ylim()[0], " %s" % msg, fontsize=16)
+                    #del msgs[i]
 
-    # Plot what needs to be plotted
-    filter_n = 5000
+                    i += 1
 
-    colors = ["red", "blue"]
+            fig.canvas.draw_idle()
+
+        #fig.canvas.mpl_connect("motion_notify_event", hover)
+        fig.canvas.mpl_connect("scroll_event", scroll)
 
-    for i in range(len(stats)):
-        ax.plot(times[i], signal.lfilter([1.0 / filter_n] * filter_n, 1, medians[i]), colors[i])
+    # Plot what needs to be plotted, the median and bands of a subset are smoothed together
+    colors = config["colors"]
 
-        if show_bands:
-            ax.plot(times[i], signal.lfilter([1.0 / filter_n] * filter_n, 1, confidence[i][0]), "grey", linestyle="dashed", linewidth=0.5)
-            ax.plot(times[i], signal.lfilter([1.0 / filter_n] * filter_n, 1, confidence[i][1]), "grey", linestyle="dashed", linewidth=0.5)
-            ax.fill_between(times[i], \
-                signal.lfilter([1.0 / filter_n] * filter_n, 1, confidence[i][0]), signal.lfilter([1.0 / filter_n] * filter_n, 1, confidence[i][1]), \
-                color=colors[i], alpha=0.2)
+    for i in range(len(stat["medians"])):
+        series = np.vstack((stat["medians"][i],) + (stat["confidence"][i] if config["show_bands"] else ()))
+        series = rolling.smooth(series, config["smooth_n"], config["smooth"])
 
-ax.set_xlim(0, 30 * 60 * 1000)
-#ax.set_ylim(0, 16)
+        lod.plot(ax, stat["times"][i], series[0], colors[i])
 
-plt.legend(handles=[mpatches.Patch(color="red", label="Small bites (5x5), n = 12"), \
-    mpatches.Patch(color="blue", label="Large bites (10x10), n = 12"), \
-    mpatches.Patch(color="black", alpha=0.2, label="Significant difference (p < 0.05)")])
+        if config["show_bands"]:
+            lod.plot(ax, stat["times"][i], series[1], "grey", linestyle="dashed", linewidth=0.5)
+            lod.plot(ax, stat["times"][i], series[2], "grey", linestyle="dashed", linewidth=0.5)
+            ax.fill_between(stat["times"][i], series[1], series[2], color=colors[i], alpha=0.2)
 
-plt.title("Suture tension over 30 mins at 20 mmHg IAP in six porcine abdominal walls\n")
-plt.grid()
-ax.set_ylabel("Change in force (N)")
-ax.set_xlabel("Time (h:mm:ss)")
+    ax.set_xlim(*config["x_lim"])
+    #ax.set_ylim(0, 16)
 
-if show_pvals:
-    ax2 = ax.twinx()
-    ax2.set_ylabel("p-value")
-    ax2.axhline(0.05, color="black")
-    ax2.plot(pval_times, pvals, color="green")
+    ax.legend(handles=[mpatches.Patch(color=color, label="%s, n = %i" % (label, b - a)) \
+        for (a, b), label, color in zip(config["stats"], config["labels"], colors)] + \
+        [mpatches.Patch(color="black", alpha=0.2, label="Significant difference (p < %g)" % config["alpha"])])
 
-# Code for drawing significant (p < 0.05) shading in the graph
-a = None
-b = None
-for i, pval in enumerate(pvals):
-    if a is None and pval < 0.05:
-        a = pval_times[i]
-    elif a is not None and pval >= 0.05:
-        b = pval_times[i]
+    ax.set_title(config["title"])
+    ax.grid()
+    ax.set_ylabel(config["y_label"])
+    ax.set_xlabel("Time (h:mm:ss)")
 
-    if a is not None and b is not None:
+    if config["show_pvals"]:
+        ax2 = ax.twinx()
+        ax2.set_ylabel("p-value")
+        ax2.axhline(config["alpha"], color="black")
+        ax2.plot(stat["pval_times"], stat["pvals"], color="green")
+
+    # Shade the significant (p < alpha) spans in the graph
+    for a, b in stat["sig_spans"]:
         ax.axvspan(a, b, alpha=0.2, color="black")
-        a = None
-        b = None
 
-if a is not None and b is None:
-    ax.axvspan(a, ax.get_xlim()[1], alpha=0.2, color="black")
+    return fig
+
+# Write the figure and the numbers behind it: <name>.png, <name>_stats.csv (per group), <name>_pvals.csv and <name>_spans.csv
+def save(config, fig, stat, directory):
+    os.makedirs(directory, exist_ok=True)
+    base = os.path.join(directory, config["name"])
+
+    fig.savefig(base + ".png", dpi=150, bbox_inches="tight")
+
+    if len(stat["times"]) > 0:
+        L = max([len(t) for t in stat["times"]])
+        columns = [max(stat["times"], key=len)]
+        names = ["time (ms)"]
+
+        for i, label in enumerate(config["labels"][:len(stat["medians"])]):
+            series = [("mean", stat["averages"][i]), ("median", stat["medians"][i])]
+            if config["show_bands"]:
+                series += [("q25", stat["confidence"][i][0]), ("q75", stat["confidence"][i][1])]
 
-plt.show()
+            for name, s in series:
+                columns.append(np.concatenate((s, np.full(L - len(s), np.nan))))
+                names.append("%s %s" % (label, name))
 
+        np.savetxt(base + "_stats.csv", np.column_stack(columns), delimiter=",", header=",".join(names), comments="", fmt="%.6g")
+
+    np.savetxt(base + "_pvals.csv", np.column_stack((stat["pval_times"], stat["pvals"])).reshape(-1, 2), delimiter=",", \
+        header="time (ms),p", comments="", fmt="%.6g")
+    np.savetxt(base + "_spans.csv", np.array(stat["sig_spans"]).reshape(-1, 2), delimiter=",", \
+        header="start (ms),end (ms)", comments="", fmt="%i")
+
+    print("Saved %s to %s" % (config["name"], directory))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Plot and test recorded trials. Without configs the options at the top of " \
+        "this file are shown in a window, with configs every analysis is saved to --out without a window.")
+    parser.add_argument("configs", nargs="*", help="analysis configs (JSON, see analyses/example.json)")
+    parser.add_argument("--out", default="reports", help="directory for the figures and CSV files (default: reports)")
+    parser.add_argument("--workers", type=int, default=WORKERS, help="processes for the trials (default: one per core)")
+    args = parser.parse_args()
+
+    if len(args.configs) == 0:
+        config = default_config()
+        results = process(config, args.workers)
+        fig = plot(config, results, statistics(config, results))
+        plt.show()
+    else:
+        plt.switch_backend("Agg")
+        configs = [load_config(file) for file in args.configs] # Fail early on a broken config
+        memo = {}
+
+        # One pool for all analyses, its processes keep the parsed files in memory
+        pool = ProcessPoolExecutor(max_workers=args.workers) if args.workers != 1 else None
+
+        try:
+            for config in configs:
+                __start__ = millis()
+                results = process(config, args.workers, pool, memo)
+                stat = statistics(config, results)
+                fig = plot(config, results, stat)
+
+                save(config, fig, stat, args.out)
+                plt.close(fig)
+
+                print("%s took %.1f s" % (config["name"], (millis() - __start__) / 1000))
+        finally:
+            if pool is not None:
+                pool.shutdown()
@@ -4,7 +4,11 @@
 
     Gathering of "raw" Force Sensitive Resistor data from analog input
     Configurable measurement frequency
-    Note: higher frequencies (>200) might not play nice with python
+    Note: higher frequencies (>200) might not play nice with python in text mode
+
+    Text mode (default): "time,pin,value" lines
+    Binary mode: 8 byte frames, requested by the host answering INIT_COMPLETE with 'B' (see protocol.py)
+      0xA5, time (ms, uint32), pin << 10 | value (uint16), XOR checksum of the 6 bytes in between
 */
 
 int sensorPins[] = {0, 1, 2, 3, 4, 5};
@@ -14,6 +18,8 @@ int sensorCount = sizeof(sensorPins) / sizeof(int);
 int MEASUREMENT_FREQ = 10; // Measurement frequency (Hz)
 unsigned long curr_t = 0;
 unsigned long tmp_t = 0;
+bool binaryMode = false;
+const unsigned long MODE_TIMEOUT = 500; // Time (ms) the host gets to request binary mode
 
 void setup()
 {
@@ -28,6 +34,35 @@ void setup()
   }
 
   Serial.println("INIT_COMPLETE");
+
+  // Wait for the host to request binary mode, otherwise stick to text
+  unsigned long start_t = millis();
+  while((millis() - start_t) < MODE_TIMEOUT) {
+    if(Serial.available() > 0) {
+      if(Serial.read() == 'B') {
+        binaryMode = true;
+        Serial.println("BINARY_MODE");
+      }
+      break;
+    }
+  }
+}
+
+void sendFrame(unsigned long t, int pin, int val)
+{
+  byte frame[8];
+  unsigned int pinval = (pin << 10) | (val & 0x3FF);
+
+  frame[0] = 0xA5;
+  frame[1] = t & 0xFF;
+  frame[2] = (t >> 8) & 0xFF;
+  frame[3] = (t >> 16) & 0xFF;
+  frame[4] = (t >> 24) & 0xFF;
+  frame[5] = pinval & 0xFF;
+  frame[6] = (pinval >> 8) & 0xFF;
+  frame[7] = frame[1] ^ frame[2] ^ frame[3] ^ frame[4] ^ frame[5] ^ frame[6];
+
+  Serial.write(frame, 8);
 }
 
 void loop()
@@ -45,6 +80,12 @@ void loop()
     analogRead(sensorPins[i]);
     sensorVal = analogRead(sensorPins[i]);
     timers[i] = curr_t;
+
+    if(binaryMode) {
+      sendFrame(curr_t, sensorPins[i], sensorVal);
+      continue;
+    }
+
     Serial.print(curr_t);
     Serial.print(",");
     Serial.print(sensorPins[i]);
@@ -0,0 +1,271 @@
+"""
+    live.py
+    Created by Floris P.J. den Hartog, 2018
+
+    The live graph of main.py, without Tk: takes in the batches of samples the serial readers put in the ring buffers
+    (saving, converting to the y-axis unit, running averages and extrema) and redraws the graph, blitting the lines when the axes
+    didn't change. main.FSR draws it on its Tk canvas, benchmark.py on a matplotlib Agg canvas
+"""
+
+import numpy as np
+import buffers, running, lod
+
+# Y-axis units, the index is the option
+UNITS = ["Raw value (0-1023)", "Voltage (mV)", "Resistance (Ohm)", "Conductance (uS)", \
+         "Avg. voltage (mV)", "Avg. resistance (Ohm)", "Avg. conductance (uS)", \
+         "EMA voltage (mV)", "EMA resistance (Ohm)", "EMA conductance (uS)", \
+         "Mov. avg. voltage (mV)", "Mov. avg. resistance (Ohm)", "Mov. avg. conductance (uS)"]
+
+OPT_RAW = 0
+OPT_VOLTAGE = 1
+OPT_RESISTANCE = 2
+OPT_CONDUCTANCE = 3
+OPT_VOLTAGE_AVG = 4
+OPT_RESISTANCE_AVG = 5
+OPT_CONDUCTANCE_AVG = 6
+OPT_VOLTAGE_EMA = 7
+OPT_RESISTANCE_EMA = 8
+OPT_CONDUCTANCE_EMA = 9
+OPT_VOLTAGE_MAVG = 10
+OPT_RESISTANCE_MAVG = 11
+OPT_CONDUCTANCE_MAVG = 12
+
+class liveGraph:
+    # canvas: a matplotlib canvas that supports blitting, plot: the axes the lines are in
+    # x_margin: part of the time axis kept free ahead of the data, the graph is only fully redrawn when data reaches it
+    def __init__(self, canvas, plot, x_margin=0.1):
+        self.canvas = canvas
+        self.plot = plot
+        self.x_margin = x_margin
+
+        self.lines = [] # One per channel (see set_channels)
+        self.names = []
+
+        self.background = None
+        self.full_redraw = True
+
+        self.canvas.mpl_connect("draw_event", self.cache_background)
+
+    # Called after every full redraw (also when the window is resized)
+    def cache_background(self, e):
+        self.background = self.canvas.copy_from_bbox(self.plot.bbox)
+
+    # Lines (animated, so they are left out of a full redraw) and names of the channels, call reset afterwards
+    def set_channels(self, lines, names):
+        self.lines = lines
+        self.names = names
+        self.full_redraw = True
+
+    # Start over with empty graph windows of cutoff samples per channel
+    def reset(self, calc, cutoff, mavg_n):
+        self.calc = calc
+
+        self.windows = [] # Time, raw sensor readouts and processed readouts (voltage, resistance, etc.) in the graph, per channel
+        self.running = [] # Running averages over the displayed data, per channel
+        self.extrema = [] # Min/max of the displayed data, per channel
+        self.force_extrema = [] # Min/max/peak force for the live readouts, per channel
+
+        for line in self.lines:
+            self.windows.append(buffers.windowBuffer(cutoff))
+            self.running.append(running.runningStats(self.calc, mavg_n))
+            self.extrema.append(running.windowExtrema(cutoff))
+            self.force_extrema.append(running.windowExtrema(cutoff))
+
+            line.set_data([], [])
+
+        self.full_redraw = True
+
+    # Empty the graph window of a channel, e.g. when it is no longer shown
+    def clear(self, pin):
+        self.windows[pin].clear()
+        self.running[pin].reset()
+        self.extrema[pin].reset()
+        self.lines[pin].set_data([], [])
+
+    # Moving average window changed, start the averages over from the data in the graph
+    def set_mavg(self, mavg_n):
+        for i in range(0, len(self.windows)):
+            self.running[i].rebuild(self.windows[i].raw.tolist(), mavg_n)
+
+    # Amount of datapoints changed, resize the graph windows (keeping the newest data)
+    def resize(self, cutoff):
+        for i in range(0, len(self.windows)):
+            if cutoff < len(self.windows[i]):
+                self.running[i].rebuild(self.windows[i].raw[-cutoff:].tolist())
+
+            self.windows[i].resize(cutoff)
+            self.extrema[i].resize(cutoff)
+            self.force_extrema[i].resize(cutoff)
+            self.update_line(i)
+
+    # Newest time shown of the first of pins that shows data, None if none do
+    def newest(self, pins):
+        shown = [pin for pin in pins if len(self.windows[pin]) > 0]
+
+        return int(self.windows[shown[0]].times[-1]) if len(shown) > 0 else None
+
+    # Everything the readers put in the rings since the last refresh: count it (see metrics.loopMetrics), save the channels in rec_pins
+    # and convert the channels in show_pins to the unit (an option, see UNITS). readout(channel, text) shows a live readout
+    def ingest(self, rings, metrics, logger, unit, show_pins, rec_pins=(), writer=None, readout=None):
+        for pin in range(0, len(rings)):
+            times, values = rings[pin].pull()
+
+            if len(times) == 0:
+                continue
+
+            metrics.count(pin, times)
+
+            if pin in rec_pins and writer is not None:
+                with metrics.timer("save"):
+                    try:
+                        writer.write_samples(pin, times, values) # Save the data to file
+                    except Exception as e:
+                        logger.error("Error saving data %s" % e, key="Error saving data")
+
+            with metrics.timer("convert"):
+                text = self.convert(pin, times, values, unit, pin in show_pins)
+
+                if readout is not None:
+                    readout(pin, text)
+
+        # Flush the data file if it's been a while
+        if writer is not None:
+            try:
+                with metrics.timer("save"):
+                    writer.check()
+            except Exception as e:
+                logger.error("Error saving data %s" % e, key="Error saving data")
+
+    # Convert a batch of samples of a channel to the y-axis unit and add them to its graph window if it's shown
+    # Returns the live readout: the latest readout, together with the min/max force in the graph window and the peak force
+    def convert(self, pin, times, values, unit, shown):
+        forces = self.calc.convert(values, "newtons")
+        extrema = self.force_extrema[pin]
+        extrema.extend(forces.tolist())
+
+        text = "Pin %s: %i mV / %.02f N (min %.02f / max %.02f / peak %.02f N)" % \
+               (self.names[pin], self.calc.convert(values[-1:], "volts")[0] * 1000, forces[-1], extrema.min(), extrema.max(), extrema.peak)
+
+        if not shown: # Skip the pins we don't want/need to read
+            return text
+
+        # Here we can interject and do calculations based on which y-axis unit we want to see
+        if unit == OPT_RAW:
+            converted = values
+        elif unit == OPT_VOLTAGE:
+            converted = self.calc.convert(values, "volts") * 1000
+        elif unit == OPT_RESISTANCE:
+            converted = self.calc.convert(values, "resists")
+        elif unit == OPT_CONDUCTANCE:
+            converted = self.calc.convert(values, "conds") * 10**6
+        else:
+            converted = None # Averages are calculated per sample below
+
+        stats = self.running[pin]
+        window = self.windows[pin]
+
+        if converted is None:
+            # The averages depend on which samples are in the window at that time, so go sample by sample
+            converted = np.zeros(len(values))
+            combined = np.concatenate((window.raw, values))
+            first_out = len(combined) - len(values) - window.capacity # Index (in combined) of the sample dropping out when values[0] comes in
+
+            for i, res_val in enumerate(values.tolist()):
+                stats.push(res_val)
+
+                if first_out + i >= 0:
+                    stats.evict(combined[first_out + i])
+
+                # Averages are in the same unit order as the options: voltage, resistance, conductance
+                if unit in (OPT_VOLTAGE_AVG, OPT_RESISTANCE_AVG, OPT_CONDUCTANCE_AVG):
+                    converted[i] = stats.average()[unit - OPT_VOLTAGE_AVG]
+                elif unit in (OPT_VOLTAGE_EMA, OPT_RESISTANCE_EMA, OPT_CONDUCTANCE_EMA):
+                    converted[i] = stats.ema[unit - OPT_VOLTAGE_EMA]
+                elif unit in (OPT_VOLTAGE_MAVG, OPT_RESISTANCE_MAVG, OPT_CONDUCTANCE_MAVG):
+                    converted[i] = stats.moving_average()[unit - OPT_VOLTAGE_MAVG]
+
+        window.extend(times, values, converted)
+        self.extrema[pin].extend(converted.tolist())
+        self.update_line(pin)
+
+        return text
+
+    # Show the window of a pin in its line, decimated to the width of the graph (see lod.py)
+    def update_line(self, pin):
+        window = self.windows[pin]
+        self.lines[pin].set_data(*lod.decimate(window.times, window.data, lod.buckets(self.plot)))
+
+    # Adjust scale of axes according to the data of pins and y_range, the (low, high) entries (None = auto-scaling)
+    # Returns True if they changed (which requires a full redraw)
+    def auto_scale(self, pins, y_range=(None, None)):
+        low_entry, high_entry = y_range
+
+        low_data = None
+        high_data = None
+        first = None
+        last = None
+
+        for i in pins:
+            if len(self.windows[i]) == 0:
+                continue
+
+            min_ = self.extrema[i].min()
+            max_ = self.extrema[i].max()
+
+            if (low_data is None) or (min_ < low_data):
+                low_data = min_
+
+            if (high_data is None) or (max_ > high_data):
+                high_data = max_
+
+            if (first is None) or (self.windows[i].times[0] < first):
+                first = self.windows[i].times[0]
+
+            if (last is None) or (self.windows[i].times[-1] > last):
+                last = self.windows[i].times[-1]
+
+        if low_data is None: # Nothing to scale to (yet)
+            return False
+
+        changed = False
+
+        # Time axis, only move it when the data reaches the edge (or the oldest data is well past the left edge)
+        xlim = self.plot.get_xlim()
+        span = max(last - first, 1)
+
+        if (last > xlim[1]) or (first < xlim[0]) or ((first - xlim[0]) > (span * self.x_margin)):
+            self.plot.set_xlim(first, last + (span * self.x_margin))
+            changed = True
+
+        # Y-axis, only rescale when the data leaves the current limits or only fills a small part of them
+        low = low_entry if low_entry is not None else low_data - ((low_data if low_data > 0 else 1) * 0.05)
+        high = high_entry if high_entry is not None else high_data + ((high_data if high_data > 0 else 1) * 0.05)
+        ylim = self.plot.get_ylim()
+
+        low_moved = (ylim[0] != low) if low_entry is not None else (low_data < ylim[0])
+        high_moved = (ylim[1] != high) if high_entry is not None else (high_data > ylim[1])
+        too_wide = ((low_entry is None) or (high_entry is None)) and ((high - low) < ((ylim[1] - ylim[0]) * 0.5))
+
+        if low_moved or high_moved or too_wide:
+            self.plot.set_ylim(low, high)
+            changed = True
+
+        return changed
+
+    # Draw the lines of pins: only redraw the whole figure when the axes (or e.g. annotations, see full_redraw) changed,
+    # otherwise just blit the lines on the cached background
+    def draw(self, pins, y_range=(None, None)):
+        if self.auto_scale(pins, y_range):
+            self.full_redraw = True
+
+        if self.full_redraw or self.background is None:
+            self.canvas.draw() # Caches the new background, see cache_background
+            self.full_redraw = False
+        else:
+            self.canvas.restore_region(self.background)
+
+        for i in pins:
+            self.plot.draw_artist(self.lines[i])
+
+        self.canvas.blit(self.plot.bbox)
+        self.canvas.flush_events()
@@ -0,0 +1,171 @@
+"""
+    loader.py
+    Created by Floris P.J. den Hartog, 2018
+
+    Loading of recorded sensor data (sensordata/*.txt or binary *.fsr) into NumPy arrays
+"""
+
+import os, re, hashlib
+import numpy as np
+import recording
+
+COMMENT = re.compile(rb"^;.*(\n|$)", re.M)
+LINE = re.compile(rb"^(-?\d+),(-?\d+),(-?\d+)$", re.M)
+LINE_BOARDS = re.compile(rb"^(-?\d+),(-?\d+),(-?\d+),(-?\d+)$", re.M) # Recordings of several boards (see writer.py)
+SETTINGS = [(re.compile(r"Recording @ (\d+) Hz, Baud rate (\d+)"), (("freq", int), ("baud", int))),
+            (re.compile(r"Vcc = ([\d.]+) V, pulldown = (\d+) Ohm"), (("Vcc", float), ("pulldown", int))),
+            (re.compile(r"Boards: (\d+) x (\d+) pins"), (("boards", int), ("pins", int)))]
+
+# Settings from the ; comments at the top of a text recording
+def read_settings(raw):
+    settings = {}
+
+    for comment in COMMENT.finditer(raw):
+        for regex, keys in SETTINGS:
+            m = regex.search(comment.group(0).decode(errors="replace"))
+
+            if m is not None:
+                for i, (key, type_) in enumerate(keys):
+                    settings[key] = type_(m.group(i + 1))
+
+    return settings
+
+# Parse a whole text recording at once, returns (settings, times, channels, readouts), the channel of a single board is the pin
+def read_text(file):
+    with open(file, "rb") as f:
+        raw = f.read()
+
+    settings = read_settings(raw)
+
+    boards = settings.get("boards", 1) > 1
+    columns = 4 if boards else 3
+
+    body = COMMENT.sub(b"", raw).replace(b"\r", b"").strip(b"\n")
+    lines = body.count(b"\n") + 1 if len(body) > 0 else 0
+
+    try:
+        data = np.fromstring(body.replace(b"\n", b","), dtype=np.int64, sep=",") if lines > 0 else np.zeros(0, dtype=np.int64)
+    except ValueError:
+        data = None
+
+    # Lines that aren't "time,pin,readout" (e.g. from a faulty serial connection), keep only the well-formed ones
+    if (data is None) or (len(data) != columns * lines) or (body.count(b",") != (columns - 1) * lines):
+        found = (LINE_BOARDS if boards else LINE).findall(body)
+        data = np.fromstring(b",".join(b",".join(m) for m in found), dtype=np.int64, sep=",")
+
+    data = data.reshape(-1, columns)
+
+    if boards:
+        return settings, data[:, 0], data[:, 1] * settings["pins"] + data[:, 2], data[:, 3]
+
+    return settings, data[:, 0], data[:, 1], data[:, 2]
+
+# Times, channels (see writer.py) and readouts of a recording, either format
+def read(file):
+    if file.endswith(recording.EXTENSION):
+        header, records = recording.load(file)
+        return records["time"].astype(np.int64), recording.channels(header, records), records["value"].astype(np.int64)
+
+    settings, times, pins, values = read_text(file)
+
+    return times, pins, values
+
+# Data file of a trial, e.g. "20190402 Varken serie/Buik 1/data_1554215695_4", preferring the binary format
+def data_file(fn):
+    fn = fn.replace("annotations", "data")
+
+    if os.path.exists("sensordata/%s%s" % (fn, recording.EXTENSION)):
+        return "sensordata/%s%s" % (fn, recording.EXTENSION)
+
+    return "sensordata/%s.txt" % fn
+
+def annotation_file(fn):
+    return "sensordata/%s.txt" % fn.replace("data", "annotations")
+
+# Times and readouts of one sensor (channel + 1, so sensor 1 = pin A0, with several boards sensor 7 = board 1 pin A0) in a trial
+def load_trial(fn, sensor, cache=None):
+    times, pins, values = read(data_file(fn)) if cache is None else cache.read(data_file(fn))
+
+    mask = (pins + 1) == sensor
+    times, values = times[mask], values[mask]
+
+    for i in np.flatnonzero(values > 1023):
+        print("Off: %i at %i in %s" % (values[i], times[i], fn))
+
+    return times, np.maximum(values, 0)
+
+def read_lines(file):
+    with open(file) as f:
+        return f.readlines()
+
+def load_annotations(fn, cache=None):
+    try:
+        return read_lines(annotation_file(fn)) if cache is None else cache.read_lines(annotation_file(fn))
+    except FileNotFoundError:
+        return []
+
+# Parses every file only once (as long as it isn't modified), optionally keeping the parsed arrays on disk between runs
+class trialCache:
+    def __init__(self, directory=None):
+        self.directory = directory
+        self.entries = {} # path -> (key, arrays)
+
+        if self.directory is not None:
+            os.makedirs(self.directory, exist_ok=True)
+
+    # Files are identified by their modification time and size, so a changed file is parsed again
+    def key(self, file):
+        stat = os.stat(file)
+        return np.array([stat.st_mtime_ns, stat.st_size], dtype=np.int64)
+
+    def get(self, file, parse):
+        key = self.key(file)
+
+        if file in self.entries and (self.entries[file][0] == key).all():
+            return self.entries[file][1]
+
+        arrays = self.read_disk(file, key)
+        if arrays is None:
+            arrays = parse(file)
+            self.write_disk(file, key, arrays)
+
+        self.entries[file] = (key, arrays)
+
+        return arrays
+
+    def disk_file(self, file):
+        return os.path.join(self.directory, "%s.npz" % hashlib.sha1(os.path.abspath(file).encode()).hexdigest())
+
+    def read_disk(self, file, key):
+        if self.directory is None or not os.path.exists(self.disk_file(file)):
+            return None
+
+        try:
+            with np.load(self.disk_file(file)) as cached:
+                if not (cached["key"] == key).all():
+                    return None
+
+                return tuple(cached["arr_%i" % i] for i in range(len(cached.files) - 1))
+        except Exception as e:
+            print("Ignoring broken cache file for %s: %s" % (file, e))
+            return None
+
+    def write_disk(self, file, key, arrays):
+        if self.directory is None:
+            return
+
+        # Written under a temporary name first, other processes may be reading the same cache
+        tmp = "%s.%i.tmp" % (self.disk_file(file), os.getpid())
+
+        with open(tmp, "wb") as f:
+            np.savez(f, *arrays, key=key)
+
+        os.replace(tmp, self.disk_file(file))
+
+    # Same as read(), but parsed only once
+    def read(self, file):
+        return self.get(file, read)
+
+    # Lines of a (small) text file, e.g. annotations
+    def read_lines(self, file):
+        return self.get(file, lambda file: (np.array(read_lines(file), dtype=str),))[0].tolist()
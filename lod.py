@@ -0,0 +1,76 @@
+"""
+    lod.py
+    Created by Floris P.J. den Hartog, 2018
+
+    Level of detail for plotting long recordings: a series is decimated to about 2 points per pixel
+    Every bucket of samples is drawn as its minimum and maximum, so peaks stay visible (unlike taking every x-th sample)
+"""
+
+import numpy as np
+
+# Number of buckets for an axes, one per pixel of its width
+def buckets(ax):
+    return max(int(ax.bbox.width), 1)
+
+# Min/max decimation of (x, y) into the given number of buckets, x has to be in ascending order
+# Only the samples between xmin and xmax are used (plus one on either side, so the line runs on to the edges)
+def decimate(x, y, buckets, xmin=None, xmax=None):
+    x = np.asarray(x)
+    y = np.asarray(y)
+
+    if xmin is not None and xmax is not None:
+        first = max(np.searchsorted(x, xmin, "left") - 1, 0)
+        last = np.searchsorted(x, xmax, "right") + 1
+        x, y = x[first:last], y[first:last]
+
+    n = len(x)
+    if n <= 2 * buckets:
+        return x, y
+
+    size = -(-n // buckets) # Samples per bucket
+    m = n - (n % size)
+
+    blocks = y[:m].reshape(-1, size)
+    starts = np.arange(0, m, size)
+    lows = starts + np.argmin(blocks, axis=1)
+    highs = starts + np.argmax(blocks, axis=1)
+
+    if m < n: # Partial bucket at the end
+        lows = np.append(lows, m + np.argmin(y[m:]))
+        highs = np.append(highs, m + np.argmax(y[m:]))
+
+    # Keep the order of min and max within a bucket, and always keep the first and last sample
+    idx = np.sort(np.column_stack((lows, highs)), axis=1).ravel()
+    idx = np.concatenate(([0], idx, [n - 1]))
+
+    return x[idx], y[idx]
+
+# A plotted line that keeps its full data and only draws the part in view, updated whenever the x-axis changes (zoom, pan, scroll)
+class lodLine:
+    def __init__(self, line, x, y):
+        self.line = line
+        self.x = np.asarray(x)
+        self.y = np.asarray(y)
+
+        ax = line.axes
+        ax.callbacks.connect("xlim_changed", lambda ax: self.update())
+        ax.figure.canvas.mpl_connect("resize_event", lambda e: self.update())
+
+    def set_data(self, x, y):
+        self.x = np.asarray(x)
+        self.y = np.asarray(y)
+        self.update()
+
+    def update(self):
+        ax = self.line.axes
+        xmin, xmax = ax.get_xlim()
+
+        self.line.set_data(*decimate(self.x, self.y, buckets(ax), xmin, xmax))
+
+# Same as ax.plot(x, y, ...) for a single line, but drawn at the level of detail of the axes, returns the Line2D
+# The decimated line keeps the extremes and end points, so autoscaling is the same as for the full data
+def plot(ax, x, y, *args, **kwargs):
+    line, = ax.plot(*decimate(x, y, buckets(ax)), *args, **kwargs)
+    lodLine(line, x, y)
+
+    return line
@@ -3,27 +3,136 @@
     Created by Floris P.J. den Hartog, 2018
 
     Main file for the logging functions used by main.py
+    Messages are queued and written by a background thread, so logging never blocks reading or drawing
 """
 
-import time
+import time, queue, threading, atexit
 from utils import timerunning, touch
 
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+LEVELS = {DEBUG: "DEBUG", INFO: "INFO", WARNING: "WARNING", ERROR: "ERROR"}
+
 class logger:
-    def __init__(self, file, time_started):
+    def __init__(self, file, time_started, level=INFO, interval=1.0):
         self.file = file
         self.time_started = time_started
-        
+        self.level = level # Messages below this level are dropped
+        self.interval = interval # Repeated messages (same key) are summarized once per interval (sec)
+
         touch(self.file) # Generate an empty log file
-    
+
+        self.queue = queue.Queue() # Unbounded, so putting never blocks
+        self.repeated = {} # key -> [first message time, count, level, last message], only used by the writer thread
+        self.fh = open(self.file, "a")
+
+        self.thread = threading.Thread(target=self.run, name="logger", daemon=True)
+        self.thread.start()
+
+        atexit.register(self.close)
+
     # Log to console and to a log file
-    def log(self, msg):
-        timerunning_ = timerunning(time.time() - self.time_started)
-        
-        print("%s - %s" % (timerunning_, msg))
-        
-        file = open(self.file, "a")
-        file.write("%s - " % timerunning_)
-        file.write(str(msg))
-        file.write("\n")
-        file.close()
-    
+    # Messages with a key are coalesced: the first one is logged, repeats within the interval are counted and summarized
+    def log(self, msg, level=INFO, key=None):
+        if level < self.level or self.thread is None:
+            return
+
+        self.queue.put((time.time(), level, str(msg), key))
+
+    def debug(self, msg, key=None):
+        self.log(msg, DEBUG, key)
+
+    def warning(self, msg, key=None):
+        self.log(msg, WARNING, key)
+
+    def error(self, msg, key=None):
+        self.log(msg, ERROR, key)
+
+    # Wait until everything logged so far is written
+    def flush(self):
+        if self.thread is not None:
+            self.queue.join()
+
+    # Write what's left (including the summaries of repeated messages) and stop the writer thread
+    def close(self):
+        if self.thread is None:
+            return
+
+        self.queue.put(None)
+        self.thread.join()
+        self.thread = None
+
+        self.fh.close()
+
+    def format(self, t, level, msg):
+        prefix = "" if level == INFO else "%s: " % LEVELS.get(level, level)
+        return "%s - %s%s" % (timerunning(t - self.time_started), prefix, msg)
+
+    def write(self, lines):
+        if len(lines) == 0:
+            return
+
+        print("\n".join(lines))
+
+        self.fh.write("".join(line + "\n" for line in lines))
+        self.fh.flush()
+
+    # Summaries of the repeated messages whose interval is over (all of them when closing)
+    def summarize(self, now, everything=False):
+        lines = []
+
+        for key, (first, count, level, last) in list(self.repeated.items()):
+            if everything or (now - first) >= self.interval:
+                if count > 0:
+                    lines.append(self.format(now, level, "%s: %i more in the last %.1f sec (last: %s)" % (key, count, now - first, last)))
+
+                del self.repeated[key]
+
+        return lines
+
+    # Writer thread, writes everything waiting in the queue at once
+    def run(self):
+        stop = False
+
+        while not stop:
+            try:
+                items = [self.queue.get(timeout=self.interval if len(self.repeated) > 0 else None)]
+            except queue.Empty:
+                items = []
+
+            while True:
+                try:
+                    items.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            lines = []
+
+            for item in items:
+                if item is None:
+                    stop = True
+                    continue
+
+                t, level, msg, key = item
+
+                if key is None:
+                    lines.append(self.format(t, level, msg))
+                elif key in self.repeated and (t - self.repeated[key][0]) < self.interval:
+                    self.repeated[key][1] += 1
+                    self.repeated[key][3] = msg
+                else:
+                    lines += self.summarize(t) if key in self.repeated else []
+                    self.repeated[key] = [t, 0, level, msg]
+                    lines.append(self.format(t, level, msg))
+
+            lines += self.summarize(time.time(), everything=stop)
+
+            try:
+                self.write(lines)
+            except Exception as e:
+                print("Error writing the log file: %s" % e)
+
+            for item in items:
+                self.queue.task_done()
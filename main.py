@@ -12,8 +12,8 @@ from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 from matplotlib.ticker import FuncFormatter
 import matplotlib.pyplot as plt
 import tkinter as Tk
-import time, serial, calculations, logger
-from utils import millis, timerunning, touch
+import time, serial, calculations, logger, buffers, reader, metrics, recorder, live
+from utils import millis, timerunning
 
 class FSR:
     def __init__(self):
@@ -21,8 +21,11 @@ class FSR:
         
 ####### User defined variables ##############################################################
         self.INIT_TIMEOUT = 5  # The amount of seconds to wait for Arduino to initialize
-        self.NUM_ANALOG = 6    # 6 max possible analog pins
+        self.NUM_ANALOG = 6    # 6 max possible analog pins (per board, several boards are used with e.g. COM port "COM4;COM5")
         self.MEASURE_FRQ = 10  # Measurement frequency (Hz)
+        self.BUFFER_SIZE = 10000 # Samples kept per pin between two graph refreshes
+        self.X_MARGIN = 0.1    # Part of the time axis kept free ahead of the data, the graph is only fully redrawn when data reaches it
+        self.METRICS_CSV = False # Also save the loop metrics (see Status) to logs/metrics_<session>_<recording #>.csv
 #############################################################################################
         
         # Misc. variable setup, don't touch
@@ -31,14 +34,16 @@ class FSR:
         
         self.logger = logger.logger("logs/log_%i.txt" % self.__start__, self.__start__)
         self.recording = False
+        self.sers = [] # Serial connection per board
+        self.serial_readers = [] # Reader thread per board, all feeding self.rings (one per channel, see init_channels)
+        self.binary_modes = []
+        self.attached = False # Viewing a headless recorder instead of recording (see recorder.py)
+        self.writer = None
+        self.metrics = None
 
-        self.OPT_RAW = 0
-        self.OPT_VOLTAGE = 1
-        self.OPT_RESISTANCE = 2
-        self.OPT_CONDUCTANCE = 3
-        self.OPT_VOLTAGE_AVG = 4
-        self.OPT_RESISTANCE_AVG = 5
-        self.OPT_CONDUCTANCE_AVG = 6
+        # Every pin of every board is a channel: channel = board * NUM_ANALOG + pin (see writer.py)
+        self.NUM_BOARDS = 1
+        self.NUM_CHANNELS = self.NUM_ANALOG
 
         self.SHOW_PINS = [] # Linked to checkbuttons
         self.REC_PINS = [] # Linked to checkbuttons
@@ -56,57 +61,53 @@ class FSR:
         self.root.update_idletasks()
         self.root.update()
 
-    # Appending to data file
-    def save_data(self, data):
-        try:
-            file = open(self.SAVE_FILE, "a")
-            file.write(data)
-            file.close()
-        except Exception as e:
-            self.logger.log("Error saving data %s" % e)
-
     # Reset variables for plotting
     def reset_vars(self):
         self.calc = calculations.calculations(self.Vcc.get(), self.pulldown.get())
 
-        self.times = []
         self.annotations = []
-        self.resistor_data_raw = []
-        self.resistor_data = []
-        
-        for i in range(0, self.NUM_ANALOG):
-            self.times.append([])
-            self.resistor_data_raw.append([]) # Raw sensor readouts, these are used for calculations
-            self.resistor_data.append([]) # Processed sensor readouts (voltage, resistance, etc.), these are drawn
-            
-            self.plot_lines[i].set_data([], [])
+        self.graph.reset(self.calc, self.POP_CUTOFF.get(), self.MAVG_N.get())
 
     def check_rec_pins(self):
-        if self.recording:
+        if self.recording and not self.attached:
             if len(self.REC_PINS) > 0:
-                self.logger.log("Recording from pin%s A%s" % ("s" if len(self.REC_PINS) > 1 else "", ", A".join(str(pin) for pin in self.REC_PINS)))
-                self.status("Recording #%i active...\nSaving: A%s" % (self.recordings, ", A".join(str(pin) for pin in self.REC_PINS)))
+                self.logger.log("Recording from pin%s %s" % ("s" if len(self.REC_PINS) > 1 else "", ", ".join(self.names[i] for i in self.REC_PINS)))
+                self.status("Recording #%i active...\nSaving: %s" % (self.recordings, ", ".join(self.names[i] for i in self.REC_PINS)))
             else:
-                self.logger.log("Warning: no data is being saved! Please check 'Save data' for the pin(s) you wish to record.")
+                self.logger.warning("No data is being saved! Please check 'Save data' for the pin(s) you wish to record.")
                 self.status("Recording #%i active...\nWarning: no data is being saved!" % self.recordings)
 
     def rec_stop(self):
         self.recording = False
-        self.logger.log("Stopping recording, saved %i measurements" % self.curr_rec_count)
 
-        self.reset_vars()
+        for serial_reader in self.serial_readers:
+            serial_reader.stop()
+            serial_reader.join()
 
-        try:
-            self.ser.close() # Close the serial connection
-        except AttributeError:
-            pass # Occurs when the serial connection was never established
-        except Exception as e:
-            self.logger.log(e)
+        self.serial_readers = []
+
+        if self.writer is not None:
+            try:
+                self.writer.close()
+            except Exception as e:
+                self.logger.error("Error saving data %s" % e, key="Error saving data")
+
+            self.curr_rec_count = self.writer.records
+            self.logger.log("Stopping recording, saved %i measurements (%i lines, %i bytes written)" % \
+                            (self.curr_rec_count, self.writer.lines_written, self.writer.bytes_written))
+            self.writer = None
+
+        if self.metrics is not None:
+            self.metrics.close()
+
+        self.reset_vars()
+        self.close_ports()
             
         self.rec_stop_btn.configure(state="disabled")
         self.rec_start_btn.configure(state="normal")
         self.root.focus() # Remove focus from the start button, could cause problems when trying to annotate
         self.status("Recording stopped")
+        self.rec_time_lbl.configure(text="") # Only shown while recording
 
     def rec_start(self):
         self.recording = True
@@ -116,44 +117,59 @@ class FSR:
         self.rec_stop_btn.configure(state="normal")
         self.root.focus() # Remove focus from the start button, could cause problems when trying to annotate
 
+        # Attached to a headless recorder (see recorder.py), which saves the data and annotations itself
+        self.attached = "://" in self.COM_PORT.get()
+
         # Check if we can initiate the serial communication
         if self.init_serial():
             self.status("Connection initiated (COM port: %s)" % self.COM_PORT)
-            self.recordings += 1
-            self.SAVE_FILE = "sensordata/data_%i_%i.txt" % (self.__start__, self.recordings)
-            self.ANNOTATION_FILE = "sensordata/annotations_%i_%i.txt" % (self.__start__, self.recordings)
+            self.curr_rec_count = 0
+
+            if self.attached:
+                self.logger.log("Attached to the recorder at %s, data and annotations are saved by the recorder" % self.COM_PORT.get())
+                self.status("Viewing recorder at %s" % self.COM_PORT.get())
+            else:
+                # Generate new, empty data files
+                self.recordings += 1
+                self.SAVE_FILE, self.ANNOTATION_FILE = recorder.file_names(self.__start__, self.recordings, self.REC_FORMAT.get() == "Binary")
+
+                self.writer = recorder.open_recording(self.SAVE_FILE, self.ANNOTATION_FILE, self.Vcc.get(), self.pulldown.get(), \
+                                                      self.MEASURE_FRQ, self.BAUD_RATE.get(), self.__start__, self.REC_FORMAT.get() == "Binary", \
+                                                      self.NUM_BOARDS, self.NUM_ANALOG)
 
-            # Generate new, empty data files
-            touch(self.SAVE_FILE)       
-            touch(self.ANNOTATION_FILE)
+                self.logger.log("Arduino%s initialized, starting recording #%i of this session" % ("s" if self.NUM_BOARDS > 1 else "", self.recordings))
+                self.logger.log("Currently recording to file: %s" % self.SAVE_FILE)
 
-            self.logger.log("Arduino initialized, starting recording #%i of this session" % self.recordings)
-            self.logger.log("Currently recording to file: %s" % self.SAVE_FILE)
-            self.save_data("; Recording @ %i Hz, Baud rate %i\n" % (self.MEASURE_FRQ, self.BAUD_RATE.get()))
-            self.save_data("; Vcc = %.02f V, pulldown = %i Ohm\n" % (self.Vcc.get(), self.pulldown.get()))
-            self.save_data("; Key: time (ms), pin (A0-5), readout (0-1023)\n")
+                self.check_rec_pins()
 
-            self.check_rec_pins()
             self.__rec_start__ = time.time()
+            self.metrics = metrics.loopMetrics(self.NUM_CHANNELS, 1000 / self.MEASURE_FRQ, \
+                                               "logs/metrics_%i_%i.csv" % (self.__start__, self.recordings) if self.METRICS_CSV else None, \
+                                               names=self.names)
             self.record()
         else:
             self.recording = False
+            self.close_ports()
             
             self.rec_start_btn.configure(state="normal")
             self.rec_stop_btn.configure(state="disabled")
 
             self.status("Connection failed")
-            self.logger.log("Connection failed")
+            self.logger.error("Connection failed")
 
     def quit_gui(self):
         if Tk.messagebox.askokcancel("Quit", "Do you want to quit?"):
+            if self.recording:
+                self.rec_stop()
+
             self.root.quit()
             self.root.destroy()
 
             self.logger.log("GUI exit")
+            self.logger.flush()
 
     def toggle_sensor_display(self):
-        for i in range(0, self.NUM_ANALOG):
+        for i in range(0, self.NUM_CHANNELS):
             changed = False
             state = self.sensor_display_vars[i].get()
 
@@ -167,14 +183,11 @@ class FSR:
                     changed = True
 
             if changed:
-                self.logger.log("Reset display data for Pin A%i" % i)
-                self.times[i] = []
-                self.resistor_data_raw[i] = []
-                self.resistor_data[i] = []
-                self.plot_lines[i].set_data([], [])
+                self.logger.log("Reset display data for Pin %s" % self.names[i])
+                self.graph.clear(i)
 
     def toggle_sensor_record(self):
-        for i in range(0, self.NUM_ANALOG):
+        for i in range(0, self.NUM_CHANNELS):
             changed = False
             state = self.sensor_record_vars[i].get()
 
@@ -199,13 +212,20 @@ class FSR:
         self.data_plot.set_ylabel(val)
         self.reset_vars()
 
+    # Moving average window changed, start the averages over from the data in the graph
+    def mavg_change(self, val):
+        self.graph.set_mavg(self.MAVG_N.get())
+
+    # Amount of datapoints changed, resize the graph windows (keeping the newest data)
+    def cutoff_change(self, val):
+        self.graph.resize(self.POP_CUTOFF.get())
+
     def add_annotation(self, e):
-        check = sum([len(s) for s in self.times])
-        if check == 0:
-            self.logger.log("Can't add an annotation if no data is being shown")
+        t = self.graph.newest(self.SHOW_PINS)
+        if t is None:
+            self.logger.warning("Can't add an annotation if no data is being shown")
             return
             
-        t = self.times[self.SHOW_PINS[0]][-1]
         msg = Tk.simpledialog.askstring("Add annotation", "Message (optional):", parent=self.root)
 
         if msg is not None:
@@ -214,15 +234,15 @@ class FSR:
             txt = self.data_plot.text(t, 0, " %s" % msg, fontsize=16)
             
             self.annotations.append((t, msg, ln, txt))
-            
-            data = "%s,%s\n" % (t, msg)
+            self.graph.full_redraw = True
             
             try:
-                file = open(self.ANNOTATION_FILE, "a")
-                file.write(data)
-                file.close()
+                if self.attached: # The recorder saves it
+                    self.sers[0].write(recorder.ANNOTATE + ("%s,%s\n" % (t, msg)).encode())
+                else:
+                    recorder.save_annotation(self.ANNOTATION_FILE, t, msg)
             except Exception as e:
-                self.logger.log("Error saving data %s" % e)
+                self.logger.error("Error saving data %s" % e, key="Error saving data")
      
     def init_gui(self):
         # Initialize Tk, create layout elements
@@ -251,6 +271,10 @@ class FSR:
         self.status_lbl = Tk.Label(master=self.status_frame)
         self.status_lbl.pack()
         self.status("Disconnected")
+        self.rec_time_lbl = Tk.Label(master=self.status_frame)
+        self.rec_time_lbl.pack()
+        self.metrics_lbl = Tk.Label(master=self.status_frame, justify=Tk.LEFT, font=("Courier", 8))
+        self.metrics_lbl.pack()
         
         # Start/stop buttons+frame
         self.controls_frame = Tk.LabelFrame(master=self.panel_left, text="Controls", pady=10)
@@ -268,16 +292,23 @@ class FSR:
         self.POP_CUTOFF = Tk.IntVar()
         self.POP_CUTOFF.set(1000)
 
-        self.cutoff_entry = Tk.Scale(master=self.controls_frame, length=150, from_=100, to=2500, resolution=100, label="Datapoints to show", orient=Tk.HORIZONTAL, variable=self.POP_CUTOFF)
+        self.cutoff_entry = Tk.Scale(master=self.controls_frame, length=150, from_=100, to=2500, resolution=100, label="Datapoints to show", orient=Tk.HORIZONTAL, \
+                                     variable=self.POP_CUTOFF, command=self.cutoff_change)
 
         # Y-axis unit selection
         self.y_unit = Tk.StringVar()
-        self.y_unit_opts = ["Raw value (0-1023)", "Voltage (mV)", "Resistance (Ohm)", "Conductance (uS)", \
-                            "Avg. voltage (mV)", "Avg. resistance (Ohm)", "Avg. conductance (uS)"]
-        self.y_unit.set(self.y_unit_opts[self.OPT_RAW])
+        self.y_unit_opts = live.UNITS
+        self.y_unit.set(self.y_unit_opts[live.OPT_RAW])
         
         self.unit_select_label = Tk.Label(master=self.controls_frame, text="Y-axis unit:")
         self.unit_select_opts = Tk.OptionMenu(self.controls_frame, self.y_unit, *self.y_unit_opts, command=self.y_unit_change)
+
+        # Window of the (exponential) moving averages
+        self.MAVG_N = Tk.IntVar()
+        self.MAVG_N.set(10)
+
+        self.mavg_entry = Tk.Scale(master=self.controls_frame, length=150, from_=2, to=200, resolution=1, label="Moving avg. (datapoints)", orient=Tk.HORIZONTAL, \
+                                   variable=self.MAVG_N, command=self.mavg_change)
         
         # Y-axis scaling
         self.Y_RANGE_LOW = Tk.IntVar()
@@ -300,6 +331,8 @@ class FSR:
 
         self.com_label = Tk.Label(master=self.settings_frame, text="COM port:")
         self.com_entry = Tk.Entry(master=self.settings_frame, textvariable=self.COM_PORT, width=8)
+        self.com_entry.bind("<FocusOut>", self.ports_change)
+        self.com_entry.bind("<Return>", self.ports_change)
         
         self.BAUD_RATE = Tk.IntVar()
         self.BAUD_RATE.set(128000)
@@ -318,6 +351,17 @@ class FSR:
 
         self.pulldown_label = Tk.Label(master=self.settings_frame, text="Pulldown:")
         self.pulldown_entry = Tk.Entry(master=self.settings_frame, textvariable=self.pulldown, width=8)
+
+        self.BINARY = Tk.IntVar()
+        self.BINARY.set(0)
+
+        self.binary_box = Tk.Checkbutton(master=self.settings_frame, text="Binary protocol", variable=self.BINARY)
+
+        self.REC_FORMAT = Tk.StringVar()
+        self.REC_FORMAT.set("Text")
+
+        self.format_label = Tk.Label(master=self.settings_frame, text="Save as:")
+        self.format_opts = Tk.OptionMenu(self.settings_frame, self.REC_FORMAT, "Text", "Binary")
         
         # Setup the grid within panel_left
         self.rec_start_btn.grid(row=0, column=0, columnspan=2)
@@ -334,6 +378,7 @@ class FSR:
 
         self.unit_select_label.grid(row=9, column=0, columnspan=2, pady=(10, 0))
         self.unit_select_opts.grid(row=10, column=0, columnspan=2)
+        self.mavg_entry.grid(row=11, column=0, pady=(10, 0), columnspan=2)
 
         self.com_label.grid(row=0, column=0)
         self.com_entry.grid(row=0, column=1)
@@ -343,6 +388,9 @@ class FSR:
         self.Vcc_entry.grid(row=2, column=1)
         self.pulldown_label.grid(row=3, column=0)
         self.pulldown_entry.grid(row=3, column=1)
+        self.binary_box.grid(row=4, column=0, columnspan=2)
+        self.format_label.grid(row=5, column=0)
+        self.format_opts.grid(row=5, column=1)
         
         self.status_frame.grid(row=0, column=0, sticky="nsew")
         self.controls_frame.grid(row=1, column=0, sticky="nsew", pady=(10,0))
@@ -357,66 +405,112 @@ class FSR:
         # Init matplotlib graph at this point
         self.init_mpl()
 
-        # Right panel
+        # Right panel, the sensor selection and live readouts (see init_channels)
+        self.init_channels()
+
+        # Apply grid to right panel
+        self.panel_right.grid(row=0, column=2, sticky="n")
+
+        # Instantiate Tk window for the first time
+        self.update_gui()
+
+    # (Re)build everything there is one of per channel: sensor selection, live readouts, plot lines and ring buffers
+    # With several boards every board gets its own column, and its lines their own style
+    def init_channels(self):
+        self.NUM_CHANNELS = self.NUM_BOARDS * self.NUM_ANALOG
+        self.names = recorder.channel_names(self.NUM_BOARDS, self.NUM_ANALOG)
+        self.rings = [buffers.sampleRing(self.BUFFER_SIZE) for i in range(0, self.NUM_CHANNELS)]
 
         # Display selection frame
         self.sensor_select_frame = Tk.LabelFrame(master=self.panel_right, padx=5, text="Sensor selection")
 
-        self.sensor_select_labels = [Tk.Label(master=self.sensor_select_frame, text="Pin A%i:" % i) for i in range(0, self.NUM_ANALOG)]
+        self.sensor_select_labels = [Tk.Label(master=self.sensor_select_frame, text="Pin %s:" % self.names[i]) for i in range(0, self.NUM_CHANNELS)]
         self.sensor_record_boxes = []
         self.sensor_display_boxes = []
-        self.sensor_record_vars = [Tk.IntVar() for i in range(0, self.NUM_ANALOG)]
-        self.sensor_display_vars = [Tk.IntVar() for i in range(0, self.NUM_ANALOG)]
-        j = 0
-        for i in range(0, self.NUM_ANALOG):
-            self.sensor_select_labels[i].grid(row=j, column=0)
+        self.sensor_record_vars = [Tk.IntVar() for i in range(0, self.NUM_CHANNELS)]
+        self.sensor_display_vars = [Tk.IntVar() for i in range(0, self.NUM_CHANNELS)]
+
+        for i in range(0, self.NUM_CHANNELS):
+            board, pin = divmod(i, self.NUM_ANALOG)
+            j = pin * 2
+
+            self.sensor_select_labels[i].grid(row=j, column=(board * 2))
             
             self.sensor_display_boxes.append(Tk.Checkbutton(master=self.sensor_select_frame, text="Display in graph", \
                                                             command=self.toggle_sensor_display, variable=self.sensor_display_vars[i]))
             
             self.sensor_record_boxes.append(Tk.Checkbutton(master=self.sensor_select_frame, text="Save data", \
                                                             command=self.toggle_sensor_record, variable=self.sensor_record_vars[i]))
-            
-            self.sensor_display_boxes[i].grid(row=j, column=1, sticky="w")
-            self.sensor_record_boxes[i].grid(row=(j+1), column=1, sticky="w", pady=(0, (5 if i < (self.NUM_ANALOG - 1) else 0)))
 
-            j += 2
+            # Keep the selection when the panel is rebuilt
+            self.sensor_display_vars[i].set(1 if i in self.SHOW_PINS else 0)
+            self.sensor_record_vars[i].set(1 if i in self.REC_PINS else 0)
+            
+            self.sensor_display_boxes[i].grid(row=j, column=(board * 2 + 1), sticky="w")
+            self.sensor_record_boxes[i].grid(row=(j+1), column=(board * 2 + 1), sticky="w", pady=(0, (5 if pin < (self.NUM_ANALOG - 1) else 0)))
 
         self.sensor_select_frame.grid(row=0, column=0, padx=10, pady=10, sticky="nsew")
 
         # Sensor readouts frame
         self.sensor_readout_frame = Tk.LabelFrame(master=self.panel_right, padx=5, text="Live readouts")
 
-        # Create 1 label per pin
-        self.sensor_readouts = [Tk.Label(master=self.sensor_readout_frame, text=("Pin A%i: 0 mV / 0.00 N" % i)) for i in range(0, self.NUM_ANALOG)]
-        for i in range(0, self.NUM_ANALOG):
-            self.sensor_readouts[i].pack(side=Tk.TOP, anchor="w")
+        # Create 1 label per channel
+        self.sensor_readouts = [Tk.Label(master=self.sensor_readout_frame, text=("Pin %s: 0 mV / 0.00 N" % self.names[i])) for i in range(0, self.NUM_CHANNELS)]
+        for i in range(0, self.NUM_CHANNELS):
+            board, pin = divmod(i, self.NUM_ANALOG)
+            self.sensor_readouts[i].grid(row=pin, column=board, sticky="w", padx=(0, 10))
 
         self.sensor_readout_frame.grid(row=1, column=0, sticky="nsew", padx=10, pady=(0, 10))
 
-        # Apply grid to right panel
-        self.panel_right.grid(row=0, column=2, sticky="n")
+        # Instantiate a line in the graph for every channel we could potentially read
+        # Animated lines are left out of a full redraw, they are blitted on top of the cached background
+        for line in self.plot_lines:
+            line.remove()
 
-        # Instantiate Tk window for the first time
-        self.update_gui()
+        self.plot_lines = []
+        for i in range(0, self.NUM_CHANNELS):
+            board, pin = divmod(i, self.NUM_ANALOG)
+            tmp, = self.data_plot.plot([], [], self.cols[pin % len(self.cols)] + self.styles[board % len(self.styles)], animated=True)
+            self.plot_lines.append(tmp)
+
+        self.graph.set_channels(self.plot_lines, self.names)
+
+    # The amount of boards changed, rebuild the channels (the selected pins of the remaining boards stay selected)
+    def set_boards(self, boards):
+        if boards == self.NUM_BOARDS:
+            return
+
+        self.logger.log("Using %i board%s (%i pins)" % (boards, "s" if boards > 1 else "", boards * self.NUM_ANALOG))
+
+        self.NUM_BOARDS = boards
+        self.SHOW_PINS = [i for i in self.SHOW_PINS if i < boards * self.NUM_ANALOG]
+        self.REC_PINS = [i for i in self.REC_PINS if i < boards * self.NUM_ANALOG]
+
+        self.sensor_select_frame.destroy()
+        self.sensor_readout_frame.destroy()
+        self.init_channels()
+        self.reset_vars()
+
+    # COM port entry changed, e.g. "COM4;COM5" for 2 boards
+    def ports_change(self, e=None):
+        if not self.recording and not "://" in self.COM_PORT.get():
+            self.set_boards(max(len(recorder.split_ports(self.COM_PORT.get())), 1))
 
     def init_mpl(self):
         # Initialize matplotlib
-        self.plot_lines = []
-        self.cols = ["b-", "r-", "g-", "b-", "m-", "c-"]
+        self.plot_lines = [] # Created per channel in init_channels
+        self.cols = ["b", "r", "g", "b", "m", "c"] # Per pin
+        self.styles = ["-", "--", ":", "-."] # Per board
         self.fig = plt.figure()
         self.data_plot = self.fig.add_subplot(111)
-        self.data_plot.set_autoscale_on(True)
+        self.data_plot.set_autoscale_on(False) # Scaling is done by the live graph (see live.py)
         self.data_plot.set_title("Sensor Data\n")
         self.data_plot.set_ylabel(self.y_unit.get())
         self.data_plot.set_xlabel("Time")
-
-        # Instantiate a line in the graph for every pin we could potentially read
-        for i in range(0, self.NUM_ANALOG):
-            tmp, = self.data_plot.plot([], [], self.cols[i])
-            self.plot_lines.append(tmp)
+        self.data_plot.xaxis.set_major_formatter(FuncFormatter(lambda x, pos: timerunning(x / 1000)))
 
         self.canvas = FigureCanvasTkAgg(self.fig, master=self.canvas_container)
+        self.graph = live.liveGraph(self.canvas, self.data_plot, self.X_MARGIN)
         self.canvas.draw()
         self.canvas.get_tk_widget().pack(fill=Tk.BOTH, expand=1)
 
@@ -424,136 +518,107 @@ class FSR:
 
     def init_serial(self):
         self.can_start = False # To wait for Arduino to give the go-ahead
+        self.sers = []
+        self.binary_modes = []
+        pins = 0
 
-        # Wait for serial connection
-        timer = millis()
-        while True:
-            self.update_gui()
+        for port in recorder.split_ports(self.COM_PORT.get()):
+            # Wait for serial connection
+            timer = millis()
+            while True:
+                self.update_gui()
 
-            if not self.recording:
-                return False
-            
-            try:
-                self.ser = serial.Serial(self.COM_PORT.get(), self.BAUD_RATE.get())
-                break
-            except serial.SerialException as e:
-                if (millis() - timer) >= 1000: # Give an error every second
-                    self.status("Connect Arduino to USB!")
-                    self.logger.log("Connect Arduino to USB!")
-                    timer = millis()
-
-        # Wait for the go-ahead from Arduino
-        timer = millis()
-        while True:
-            self.update_gui()
-
-            if not self.recording:
+                if not self.recording:
+                    return False
+                
+                try:
+                    self.sers.append(recorder.open_port(port, self.BAUD_RATE.get(), self.MEASURE_FRQ, self.NUM_ANALOG))
+                    break
+                except serial.SerialException as e:
+                    if (millis() - timer) >= 1000: # Give an error every second
+                        self.status("Connect Arduino to USB! (%s)" % port)
+                        self.logger.warning("Connect Arduino to USB! (%s)" % port, key="Connect Arduino to USB!")
+                        timer = millis()
+
+            # Wait for the go-ahead from Arduino
+            initialized, binary_mode, initialized_pins = recorder.handshake(self.sers[-1], self.logger, self.BINARY.get() == 1, \
+                                                                            self.INIT_TIMEOUT, self.waiting)
+            if not initialized:
                 return False
 
+            self.binary_modes.append(binary_mode)
+            pins += initialized_pins
+
+        # A recorder announces all channels of its boards as pins
+        self.set_boards(max(-(-pins // self.NUM_ANALOG), 1) if self.attached else max(len(self.sers), 1))
+        self.can_start = len(self.sers) > 0
+
+        return self.can_start
+
+    def close_ports(self):
+        for ser in self.sers:
             try:
-                data_in = self.ser.readline()
+                ser.close() # Close the serial connection
             except Exception as e:
-                self.logger.log(e)
+                self.logger.error(e)
 
-            if len(data_in) > 0:
-                try:
-                    data_in = data_in.decode().rstrip()
-
-                    if data_in == "INIT_COMPLETE":
-                        self.can_start = True
-                        return True
-                except Exception as e:
-                    self.logger.log(e)
+        self.sers = []
 
-            if (millis() - timer) >= (self.INIT_TIMEOUT * 1000):
-                self.logger.log("Arduino failed to initialize after %i sec" % self.INIT_TIMEOUT)
-                return False
+    # Keeps the GUI responsive during the handshake, stops it when the recording is cancelled
+    def waiting(self):
+        self.update_gui()
+        return self.recording
 
-    # Main loop
+    # Start reading from the serial port(s) in the background, a reader per board, the GUI polls the ring buffers
     def record(self):
         if not self.can_start:
             return False
-        
-        self.draw_timer = millis()
-        while self.recording:
-            self.update_gui()
-            
-            try:
-                data_in = self.ser.readline()
-            except serial.serialutil.SerialException as e:
-                self.logger.log("Reading from the serial port failed: %s" % e)
-            finally:
-                if not self.recording:
-                    return
 
-            # Check the received data
-            if len(data_in) > 1:
-                data_in = data_in.decode()
-                unpack = data_in.rstrip().split(",")
-                
-                if len(unpack) == 3: # We expect 3 variables. No more, no less
-                    try:
-                        timestamp = int(unpack[0])
-                        pin = int(unpack[1])
-                        res_val = int(unpack[2])
-                    except ValueError:
-                        self.logger.log("Faulty serial communication: %s" % ",".join(unpack))
-                        continue
-
-                    if pin in self.REC_PINS:
-                        self.curr_rec_count += 1
-                        self.save_data(data_in) # Save the data to file
-
-                    # Display readout in the proper label
-                    self.sensor_readouts[pin].config(text="Pin A%i: %i mV / %.02f N" % (pin, self.calc.val_to_volt(res_val) * 1000, self.calc.val_to_N(res_val)))
-                    
-                    if not pin in self.SHOW_PINS: # Skip the pins we don't want/need to read
-                        continue
-                   
-                    self.times[pin].append(timestamp)
-                    self.resistor_data_raw[pin].append(res_val)
-                    
-                    # Here we can interject and do calculations based on which y-axis unit we want to see
-                    opt = self.y_unit_opts.index(self.y_unit.get())
-                    
-                    if opt == self.OPT_RAW:
-                        self.resistor_data[pin].append(res_val)
-                    elif opt == self.OPT_VOLTAGE:
-                        a = self.calc.val_to_volt(res_val) * 1000
-                        self.resistor_data[pin].append(a)
-                    elif opt == self.OPT_RESISTANCE:
-                        a = self.calc.volt_to_Rfsr(self.calc.val_to_volt(res_val))
-                        self.resistor_data[pin].append(a)
-                    elif opt == self.OPT_CONDUCTANCE:
-                        a = 10**6 / self.calc.volt_to_Rfsr(self.calc.val_to_volt(res_val)) if res_val > 0 else 0
-                        self.resistor_data[pin].append(a)
-                    elif opt == self.OPT_VOLTAGE_AVG:
-                        a = sum([self.calc.val_to_volt(v) * 1000 for v in self.resistor_data_raw[pin]]) / len(self.resistor_data_raw[pin]) if len(self.resistor_data_raw[pin]) > 0 else 0
-                        self.resistor_data[pin].append(a)
-                    elif opt == self.OPT_RESISTANCE_AVG:
-                        a = sum([self.calc.volt_to_Rfsr(self.calc.val_to_volt(v)) for v in self.resistor_data_raw[pin]]) / len(self.resistor_data_raw[pin]) \
-                            if len(self.resistor_data_raw[pin]) > 0 else 0
-                        self.resistor_data[pin].append(a)
-                    elif opt == self.OPT_CONDUCTANCE_AVG:
-                        a = sum([10**6 / self.calc.volt_to_Rfsr(self.calc.val_to_volt(v)) if v > 0 else 0 for v in self.resistor_data_raw[pin]]) / len(self.resistor_data_raw[pin]) \
-                            if len(self.resistor_data_raw[pin]) > 0 else 0
-                        self.resistor_data[pin].append(a)
-
-                    self.plot_lines[pin].set_data(self.times[pin], self.resistor_data[pin])
-
-                    if len(self.times[pin]) > self.POP_CUTOFF.get():
-                        self.times[pin] = self.times[pin][-self.POP_CUTOFF.get():]
-                        self.resistor_data_raw[pin] = self.resistor_data_raw[pin][-self.POP_CUTOFF.get():]
-                        self.resistor_data[pin] = self.resistor_data[pin][-self.POP_CUTOFF.get():]
+        for ring in self.rings:
+            ring.clear()
+
+        # The clocks of several boards are aligned (see reader.clockAlignment), a recorder has already done that
+        clock = reader.clockAlignment() if len(self.sers) > 1 else None
+        per_port = self.NUM_CHANNELS // len(self.sers)
+
+        for board, ser in enumerate(self.sers):
+            self.serial_readers.append(reader.serialReader(ser, self.rings[board * per_port:(board + 1) * per_port], self.logger, \
+                                                           binary=self.binary_modes[board], board=board, clock=clock))
+            self.serial_readers[-1].start()
+
+        self.root.after(self.REFRESH_MS.get(), self.poll)
+
+    # Main loop, scheduled by Tk every REFRESH_MS
+    def poll(self):
+        if not self.recording:
+            return
+
+        self.graph.ingest(self.rings, self.metrics, self.logger, self.y_unit_opts.index(self.y_unit.get()), self.SHOW_PINS, self.REC_PINS, \
+                          self.writer, self.readout)
+
+        # Only count what is actually on disk
+        if self.writer is not None:
+            self.curr_rec_count = self.writer.records
+
+        if not all(serial_reader.is_alive() for serial_reader in self.serial_readers):
+            self.rec_stop()
+            return
 
+        with self.metrics.timer("draw"):
             self.draw()
 
-    # Adjust scale of axes according to data/entries
-    def do_auto_scale(self):
-        # Required to properly scale axes
-        self.data_plot.relim()
-        self.data_plot.autoscale_view(True, True, True)
+        if self.metrics.due():
+            pins = sorted(set(self.SHOW_PINS) | set(self.REC_PINS))
+            self.metrics_lbl.configure(text=self.metrics.text(self.metrics.snapshot(self.serial_readers, self.rings), pins))
 
+        self.root.after(self.REFRESH_MS.get(), self.poll)
+
+    # Display the latest readout of a channel in its label (see live.liveGraph.convert)
+    def readout(self, pin, text):
+        self.sensor_readouts[pin].config(text=text)
+
+    # The y-axis range entries, None for auto-scaling
+    def y_range(self):
         try:
             low_entry = int(self.Y_RANGE_LOW.get())
         except Exception as e:
@@ -564,72 +629,27 @@ class FSR:
         except Exception as e:
             high_entry = None
 
-        low_data = None
-        high_data = None
-        
-        for i in range(0, self.NUM_ANALOG):
-            try:
-                min_ = min(self.resistor_data[i])
-                max_ = max(self.resistor_data[i])
-
-                if (low_data is None) or (min_ < low_data):
-                    low_data = min_
-
-                if (high_data is None) or (max_ > high_data):
-                    high_data = max_
-            except ValueError:
-                pass
-            except Exception:
-                raise
-
-        if low_entry is not None:
-            if high_entry is not None:
-                self.data_plot.set_ylim(low_entry, high_entry)
-            else:
-                self.data_plot.set_ylim(low_entry, high_data + ((high_data if high_data > 0 else 1) * 0.05))
-        else:
-            if high_entry is not None:
-                self.data_plot.set_ylim(low_data - ((low_data if low_data > 0 else 1) * 0.05), high_entry)
-            else:
-                self.data_plot.set_ylim(low_data - ((low_data if low_data > 0 else 1) * 0.05), \
-                                  high_data + ((high_data if high_data > 0 else 1) * 0.05))
+        return low_entry, high_entry
 
     def draw(self):
-        # Draw when it's time to draw!
-        if (millis() - self.draw_timer) >= self.REFRESH_MS.get():
-            self.draw_timer = millis()
-
-            # Remove annotations that are no longer in the current time window
-            for i in range(0, len(self.annotations)):
-                try:
-                    t, msg, ln, txt = self.annotations[i]
-
-                    if (t <= self.data_plot.get_xlim()[0]):
-                        ln.remove()
-                        del ln
-                        txt.remove()
-                        del txt
-                        del self.annotations[i]
-                except IndexError:
-                    break
+        self.rec_time_lbl.configure(text="Recording: %s" % timerunning(time.time() - self.__rec_start__))
 
-            self.data_plot.set_title("Sensor data\nRecording: %s\n" % timerunning(time.time() - self.__rec_start__))
-            self.data_plot.xaxis.set_major_formatter(FuncFormatter(lambda x, pos: timerunning(x / 1000)))
-            self.do_auto_scale()
+        # Remove annotations that are no longer in the current time window
+        for i in range(len(self.annotations) - 1, -1, -1):
+            t, msg, ln, txt = self.annotations[i]
 
-            # Speeds up drawing tremendously
-            self.data_plot.draw_artist(self.data_plot.patch)
+            if (t <= self.data_plot.get_xlim()[0]):
+                ln.remove()
+                txt.remove()
+                del self.annotations[i]
+                self.graph.full_redraw = True
 
-            for i in range(0, self.NUM_ANALOG):
-                if i in self.SHOW_PINS:
-                    self.data_plot.draw_artist(self.plot_lines[i])
-                
-            self.fig.canvas.draw_idle()
-            self.fig.canvas.flush_events()
+        self.graph.draw(self.SHOW_PINS, self.y_range())
 
 if __name__ == "__main__":
     try:
         fsr = FSR()
+        fsr.root.mainloop()
     except (KeyboardInterrupt, SystemExit): # Doesn't function yet
         fsr.quit_gui()
         raise
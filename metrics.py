@@ -0,0 +1,127 @@
+"""
+    metrics.py
+    Created by Floris P.J. den Hartog, 2018
+
+    Counters and timers for the receive/draw loop of main.py, to see whether a combination of
+    measuring frequency, refresh rate and graph length can be kept up with during a long recording
+    Shown in the Status frame, optionally also saved per interval to a CSV file (logs/metrics_*.csv)
+"""
+
+import time, csv
+from contextlib import contextmanager
+import numpy as np
+
+class loopMetrics:
+    STAGES = ("parse", "save", "convert", "draw") # Parse time is measured by the reader thread (see reader.serialReader)
+
+    def __init__(self, num_pins, period_ms, file=None, interval=1.0, names=None):
+        self.num_pins = num_pins
+        self.names = names if names is not None else ["A%i" % pin for pin in range(num_pins)] # Shown per pin (or channel)
+        self.gap_ms = 2 * period_ms # Consecutive timestamps further apart than this count as a gap
+        self.interval = interval # Seconds between snapshots
+        self.file = file
+
+        self.samples = np.zeros(num_pins, dtype=np.int64)
+        self.gaps = np.zeros(num_pins, dtype=np.int64)
+        self.last_time = [None] * num_pins
+        self.time = dict((stage, 0.0) for stage in self.STAGES) # Seconds spent in every stage
+        self.calls = dict((stage, 0) for stage in self.STAGES)
+
+        # Totals at the previous snapshot, every snapshot covers the time since then
+        self.prev = {"time": time.perf_counter(), "samples": self.samples.copy(), "gaps": self.gaps.copy(), \
+                     "stages": dict(self.time), "calls": dict(self.calls), "parse": 0.0, "dropped": 0, "faulty": 0}
+
+        self.fh = None
+        if self.file is not None:
+            self.fh = open(self.file, "w", newline="")
+            self.csv = csv.writer(self.fh)
+            self.csv.writerow(["time (s)"] + ["%s samples/s" % name for name in self.names] + ["%s gaps" % name for name in self.names] + \
+                              ["%s (ms/s)" % stage for stage in self.STAGES] + ["draw (ms/call)", "backlog (bytes)", "dropped", "faulty"])
+
+        self.started = time.perf_counter()
+
+    # Time a stage of the loop: with metrics.timer("draw"): ...
+    @contextmanager
+    def timer(self, stage):
+        start = time.perf_counter()
+
+        try:
+            yield
+        finally:
+            self.time[stage] += time.perf_counter() - start
+            self.calls[stage] += 1
+
+    # Count a batch of samples of a pin, and the gaps in its timestamps (also between batches)
+    def count(self, pin, times):
+        if len(times) == 0:
+            return
+
+        self.samples[pin] += len(times)
+
+        if self.last_time[pin] is not None:
+            self.gaps[pin] += int(times[0] - self.last_time[pin] > self.gap_ms)
+
+        self.gaps[pin] += int((np.diff(times) > self.gap_ms).sum())
+        self.last_time[pin] = times[-1]
+
+    def due(self):
+        return (time.perf_counter() - self.prev["time"]) >= self.interval
+
+    # Rates over the time since the previous snapshot, readers are the serialReaders (for the parse time, backlog and faulty lines)
+    def snapshot(self, readers, rings):
+        now = time.perf_counter()
+        elapsed = max(now - self.prev["time"], 1e-9)
+
+        parse = sum(reader.parse_time for reader in readers) if len(readers) > 0 else self.prev["parse"]
+        faulty = sum(reader.faulty for reader in readers) if len(readers) > 0 else self.prev["faulty"]
+        dropped = sum(ring.dropped for ring in rings)
+
+        self.time["parse"] = parse
+        self.calls["parse"] = 0
+
+        snap = {"time": now - self.started, "rates": (self.samples - self.prev["samples"]) / elapsed, "gaps": self.gaps - self.prev["gaps"], \
+                "stages": dict((stage, (self.time[stage] - self.prev["stages"][stage]) * 1000 / elapsed) for stage in self.STAGES), \
+                "backlog": sum(reader.backlog for reader in readers), "dropped": dropped - self.prev["dropped"], "faulty": faulty - self.prev["faulty"]}
+
+        draws = self.calls["draw"] - self.prev["calls"]["draw"]
+        snap["draw_call"] = (self.time["draw"] - self.prev["stages"]["draw"]) * 1000 / draws if draws > 0 else 0.0
+
+        self.prev = {"time": now, "samples": self.samples.copy(), "gaps": self.gaps.copy(), "stages": dict(self.time), \
+                     "calls": dict(self.calls), "parse": parse, "dropped": dropped, "faulty": faulty}
+
+        if self.fh is not None:
+            self.csv.writerow(["%.3f" % snap["time"]] + ["%.2f" % rate for rate in snap["rates"]] + snap["gaps"].tolist() + \
+                              ["%.3f" % snap["stages"][stage] for stage in self.STAGES] + \
+                              ["%.3f" % snap["draw_call"], snap["backlog"], snap["dropped"], snap["faulty"]])
+            self.fh.flush()
+
+        return snap
+
+    # Totals over the whole recording so far (see benchmark.py)
+    def summary(self, readers, rings):
+        elapsed = max(time.perf_counter() - self.started, 1e-9)
+        stages = dict(self.time, parse=sum(reader.parse_time for reader in readers) if len(readers) > 0 else self.time["parse"])
+        dropped = sum(ring.dropped for ring in rings)
+        received = int(self.samples.sum())
+
+        return {"seconds": elapsed, "samples": received, "samples/s": received / elapsed, "gaps": int(self.gaps.sum()), \
+                "dropped": dropped, "drop rate": dropped / max(received + dropped, 1), "faulty": sum(reader.faulty for reader in readers), \
+                "stages": dict((stage, stages[stage] * 1000 / elapsed) for stage in self.STAGES), \
+                "draw_call": self.time["draw"] * 1000 / self.calls["draw"] if self.calls["draw"] > 0 else 0.0}
+
+    # Text for the Status frame, pins are the pins to show the rates and gaps of
+    def text(self, snap, pins):
+        return "Samples/s: %s\nGaps: %s\n%s ms/s\nDraw %.1f ms/frame, backlog %i B\nDropped %i, faulty %i" % \
+               (self.wrap(["%s %.1f" % (self.names[pin], snap["rates"][pin]) for pin in pins]), \
+                self.wrap(["%s %i" % (self.names[pin], snap["gaps"][pin]) for pin in pins]), \
+                " / ".join("%s %.1f" % (stage, snap["stages"][stage]) for stage in self.STAGES), \
+                snap["draw_call"], snap["backlog"], snap["dropped"], snap["faulty"])
+
+    # Several boards make for a lot of pins, 6 per line
+    def wrap(self, entries, per_line=6):
+        return "\n  ".join(" ".join(entries[i:i + per_line]) for i in range(0, len(entries), per_line))
+
+    def close(self):
+        if self.fh is not None:
+            self.fh.close()
+            self.fh = None
@@ -0,0 +1,166 @@
+"""
+    pipeline.py
+    Created by Floris P.J. den Hartog, 2018
+
+    Per-trial processing for data_view.py: load, remove gaps and find the baseline, the units and averages are derived on demand
+    Trials are independent until the statistics, so they are processed in parallel, one data file per process
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+import loader, processing, rolling
+from calculations import calculations
+
+# Parsed files, kept per process so the trials of one file are read only once
+caches = {}
+
+def get_cache(directory):
+    if directory not in caches:
+        caches[directory] = loader.trialCache(directory)
+
+    return caches[directory]
+
+# One processed trial: the raw readouts (after gap removal) and the index of the baseline
+# Every unit is derived from the readouts when it is first asked for (using the conversion lookup tables) and then kept,
+# so only the units that are shown get computed and switching between them is instant
+class trialTable:
+    UNITS = ("vals", "volts", "resists", "conds", "newtons")
+
+    def __init__(self, wire, ts, vals, base, every, Vcc, pulldown, annotations):
+        self.wire = wire
+        self.vals = vals
+        self.base = base
+        self.every = every
+        self.Vcc = Vcc
+        self.pulldown = pulldown
+        self.annotations = annotations
+
+        self.start = ts[base] # Recording time of the baseline, annotations are in recording time
+        self.ts = ts[base::every] - self.start # Time since the baseline, cut the same as every series below
+        self.columns = {}
+
+    # Not sent along when a table is passed between processes, it is rebuilt from the (per process) lookup tables
+    def __getstate__(self):
+        return dict(self.__dict__, columns={})
+
+    def get(self, key, compute):
+        if key not in self.columns:
+            self.columns[key] = compute()
+
+        return self.columns[key]
+
+    def check(self, unit):
+        if unit not in self.UNITS:
+            raise ValueError("Unknown unit %r, use one of %s" % (unit, self.UNITS))
+
+    @property
+    def calc(self):
+        return calculations(self.Vcc, self.pulldown)
+
+    # Convert (moving) averages, keeping the NaNs where a window isn't filled yet
+    def convert(self, x, unit):
+        missing = np.isnan(x)
+        return np.where(missing, np.nan, self.calc.convert(np.where(missing, 0, x), unit))
+
+    # Normalize against the baseline, cut at the baseline and keep only every x measurements
+    # A moving average that is still NaN at the baseline (its window isn't filled yet) is normalized against its first value after it
+    def normalize(self, x):
+        after = x[..., self.base:]
+        first = np.argmax(~np.isnan(after), axis=-1)
+
+        return (x - np.take_along_axis(after, first[..., np.newaxis], axis=-1))[..., self.base::self.every]
+
+    # Full column of readouts in a unit
+    def column(self, unit):
+        self.check(unit)
+        return self.get(unit, lambda: self.vals if unit == "vals" else self.calc.convert(self.vals, unit))
+
+    def raw(self, unit):
+        return self.get(("raw", unit), lambda: self.normalize(self.column(unit)))
+
+    def avg(self, unit):
+        self.check(unit)
+        average = self.get("avg", lambda: rolling.expanding_average(self.vals))
+
+        return self.get(("avg", unit), lambda: self.normalize(self.convert(average, unit)))
+
+    # Moving averages of the readouts, says so when a window isn't filled at the baseline
+    def moving_average(self, windows):
+        for n in windows:
+            if n > len(self.vals):
+                print("%s: moving average window of %i datapoints is longer than the trial (%i), its line stays empty" % \
+                      (self.wire, n, len(self.vals)))
+            elif n > self.base + 1:
+                print("%s: moving average window of %i datapoints isn't filled at the baseline (datapoint %i), normalized from datapoint %i" % \
+                      (self.wire, n, self.base, n - 1))
+
+        return rolling.moving_average(self.vals, windows)
+
+    # Moving averages, one row per window (datapoints)
+    def mavg(self, unit, windows):
+        self.check(unit)
+        windows = tuple(windows)
+        averages = self.get(("mavg", windows), lambda: self.moving_average(windows))
+
+        return self.get(("mavg", unit, windows), lambda: self.normalize(self.convert(averages, unit)))
+
+# Process one trial (sensor 1 = pin A0), settings is a dict with the data_view.py options (see process_all)
+# Returns a trialTable, its series are all cut at the baseline and normalized against it
+def process_trial(fn, wire, baseline, sensor, settings):
+    cache = get_cache(settings["cache_dir"])
+
+    ts, vals = loader.load_trial(fn, sensor, cache)
+    annot_lines = loader.load_annotations(fn, cache)
+
+    # Remove gaps
+    keep, gaps = processing.find_gaps(ts, settings["gap_threshold"])
+    ts = ts[keep]
+    vals = vals[keep]
+
+    if len(gaps) > 0:
+        print("%s: removed %i gaps (%.1f s)" % (wire, len(gaps), gaps[:, 2].sum() / 1000))
+
+    if settings["gap_reports"] is not None:
+        processing.write_gap_report("%s/%s.txt" % (settings["gap_reports"], wire), "%s, sensor %i (%s)" % (fn, sensor, wire), \
+            gaps, settings["gap_threshold"], (~keep).sum())
+
+    # Get base tension
+    after = np.flatnonzero(ts >= baseline)
+    if len(after) == 0:
+        raise ValueError("%s: no data at or after the baseline (%i ms)" % (wire, baseline))
+
+    return trialTable(wire, ts, vals, after[0], settings["show_every"], settings["Vcc"], settings["pulldown"], annot_lines)
+
+# All trials of one data file, entries are (wire, baseline, sensor)
+def process_file(fn, entries, settings):
+    return [process_trial(fn, wire, baseline, sensor, settings) for wire, baseline, sensor in entries]
+
+# Process trials ((fn, wire, baseline, sensor) as in data_input.py), results are in the same order as the trials
+# settings: show_every, gap_threshold, gap_reports, Vcc, pulldown, cache_dir
+# workers: number of processes, None for one per core, 1 to process everything in this process
+# pool: an executor to use instead of starting one (its processes keep the parsed files in memory between calls)
+def process_all(trials, settings, workers=None, pool=None):
+    files = {}
+    for i, (fn, wire, baseline, sensor) in enumerate(trials):
+        files.setdefault(fn, []).append((i, (wire, baseline, sensor)))
+
+    fns = list(files.keys())
+    entries = [[entry for i, entry in files[fn]] for fn in fns]
+    settings = [settings] * len(fns)
+
+    if pool is not None:
+        done = list(pool.map(process_file, fns, entries, settings))
+    elif workers == 1 or len(fns) < 2:
+        done = map(process_file, fns, entries, settings)
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers or os.cpu_count() or 1, len(fns))) as pool:
+            done = list(pool.map(process_file, fns, entries, settings))
+
+    results = [None] * len(trials)
+    for fn, file_results in zip(fns, done):
+        for (i, entry), result in zip(files[fn], file_results):
+            results[i] = result
+
+    return results
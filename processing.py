@@ -0,0 +1,38 @@
+"""
+    processing.py
+    Created by Floris P.J. den Hartog, 2018
+
+    Processing steps for recorded trials, used by data_view.py
+"""
+
+import os
+import numpy as np
+
+# Find gaps of more than threshold msec between consecutive timestamps (likely artefacts, see Figures/Data_artefacts)
+# Returns a mask of the samples to keep (both samples around a gap are removed) and the gaps as (start, end, duration) rows
+def find_gaps(ts, threshold):
+    ts = np.asarray(ts)
+    keep = np.ones(len(ts), dtype=bool)
+
+    if len(ts) < 2:
+        return keep, np.zeros((0, 3), dtype=np.int64)
+
+    d = np.abs(np.diff(ts))
+    at = np.flatnonzero(d > threshold) # Gap between at and at + 1
+
+    keep[at] = False
+    keep[at + 1] = False
+
+    return keep, np.column_stack((ts[at], ts[at + 1], d[at]))
+
+# Write the gaps found in a trial to a report file, so artefacts can be checked without reprocessing the data
+def write_gap_report(file, title, gaps, threshold, removed):
+    os.makedirs(os.path.dirname(file), exist_ok=True)
+
+    with open(file, "w") as f:
+        f.write("; Gaps > %i ms in %s\n" % (threshold, title))
+        f.write("; Count: %i, total duration: %.03f s, samples removed: %i\n" % (len(gaps), gaps[:, 2].sum() / 1000, removed))
+        f.write("; Key: start (ms), end (ms), duration (ms)\n")
+
+        for start, end, duration in gaps.tolist():
+            f.write("%i,%i,%i\n" % (start, end, duration))
@@ -0,0 +1,81 @@
+"""
+    protocol.py
+    Created by Floris P.J. den Hartog, 2018
+
+    Binary serial protocol of extract.ino (optional, negotiated after INIT_COMPLETE)
+
+    Every reading is sent as an 8 byte frame (little endian):
+      sync byte (0xA5), time (ms, uint32), pin << 10 | readout (uint16), checksum (XOR of the 6 bytes in between)
+"""
+
+import numpy as np
+
+SYNC = 0xA5
+FRAME_SIZE = 8
+FRAME = np.dtype([("sync", "u1"), ("time", "<u4"), ("pinval", "<u2"), ("check", "u1")])
+
+# Handshake: the host answers INIT_COMPLETE with REQUEST, the Arduino acknowledges with ACK
+REQUEST = b"B"
+ACK = "BINARY_MODE"
+MODE_TIMEOUT = 0.5 # Time (sec) the host gets to send REQUEST, after that extract.ino starts sending text
+
+def encode(time, pin, val):
+    frame = np.zeros(1, dtype=FRAME)
+    frame["sync"] = SYNC
+    frame["time"] = time
+    frame["pinval"] = (pin << 10) | (val & 0x3FF)
+
+    raw = bytearray(frame.tobytes())
+    raw[7] = np.bitwise_xor.reduce(np.frombuffer(bytes(raw[1:7]), dtype=np.uint8))
+
+    return bytes(raw)
+
+# Same as encode, for arrays of readings at once
+def encode_many(times, pins, vals):
+    frames = np.zeros(len(times), dtype=FRAME)
+    frames["sync"] = SYNC
+    frames["time"] = times
+    frames["pinval"] = (np.asarray(pins) << 10) | (np.asarray(vals) & 0x3FF)
+
+    raw = frames.view(np.uint8).reshape(-1, FRAME_SIZE)
+    raw[:, 7] = np.bitwise_xor.reduce(raw[:, 1:7], axis=1)
+
+    return frames.tobytes()
+
+# Decode all complete frames in buf, resyncing on the next sync byte after a corrupt frame
+# Returns (times, pins, readouts, bytes consumed, bytes skipped)
+def decode(buf):
+    data = np.frombuffer(bytes(buf), dtype=np.uint8)
+    pos = 0
+    skipped = 0
+    found = []
+
+    while (len(data) - pos) >= FRAME_SIZE:
+        n = (len(data) - pos) // FRAME_SIZE
+        frames = data[pos:pos + (n * FRAME_SIZE)].reshape(n, FRAME_SIZE)
+
+        valid = (frames[:, 0] == SYNC) & (np.bitwise_xor.reduce(frames[:, 1:7], axis=1) == frames[:, 7])
+        bad = np.flatnonzero(~valid)
+        good = n if len(bad) == 0 else bad[0]
+
+        if good > 0:
+            found.append(frames[:good])
+            pos += good * FRAME_SIZE
+
+        if good == n:
+            break
+
+        # Corrupt frame, skip to the next sync byte
+        nxt = np.flatnonzero(data[pos + 1:] == SYNC)
+        step = (nxt[0] + 1) if len(nxt) > 0 else (len(data) - pos)
+        skipped += step
+        pos += step
+
+    if len(found) == 0:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty, empty, pos, skipped
+
+    frames = np.concatenate(found).view(FRAME).ravel()
+    pinval = frames["pinval"].astype(np.int64)
+
+    return frames["time"].astype(np.int64), pinval >> 10, pinval & 0x3FF, pos, skipped
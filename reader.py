@@ -0,0 +1,168 @@
+"""
+    reader.py
+    Created by Floris P.J. den Hartog, 2018
+
+    Background thread that drains the serial port into per-pin ring buffers,
+    so that reading from the Arduino never has to wait for the GUI
+    With several Arduinos there is one reader per board, their clocks are aligned with a shared clockAlignment
+"""
+
+import threading, time, serial, protocol
+
+# Every Arduino counts from its own start, the first board to send a measurement sets the clock the others are shifted to:
+# a board's offset is chosen so that the newest measurement of its first chunk lands at the time (on that clock) it was received
+# (the oldest one could have waited in the port for seconds, the boards are opened and handshaken one after another)
+class clockAlignment:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reference = None # (receive time (host, ms), timestamp) of the first measurement of any board
+        self.offsets = {} # board -> ms added to its timestamps
+
+    def offset(self, board, timestamp, received):
+        with self.lock:
+            if self.reference is None:
+                self.reference = (received, timestamp)
+
+            self.offsets[board] = int(round(self.reference[1] + (received - self.reference[0]) - timestamp))
+
+            return self.offsets[board]
+
+class serialReader(threading.Thread):
+    def __init__(self, ser, rings, logger, binary=False, board=0, clock=None):
+        threading.Thread.__init__(self, daemon=True)
+
+        self.ser = ser
+        self.rings = rings # One buffers.sampleRing per pin (of this board)
+        self.logger = logger
+        self.binary = binary # Binary frames (see protocol.py) instead of text lines
+        self.board = board
+        self.clock = clock # Shared by the readers of all boards, None keeps the timestamps as they are
+        self.offset = None if clock is not None else 0 # Set at the first measurement
+
+        self.faulty = 0 # Amount of lines that could not be parsed
+        self.received = None # Time (ms) the last chunk came in
+        self.parse_time = 0.0 # Seconds spent parsing (see metrics.loopMetrics)
+        self.backlog = 0 # Bytes waiting in the serial port at the last read
+        self.running = threading.Event()
+        self.running.set()
+
+        # Don't block forever on an idle port, so we can notice a stop request
+        self.ser.timeout = 0.1
+
+    def stop(self):
+        self.running.clear()
+
+    def run(self):
+        pending = bytearray()
+
+        while self.running.is_set():
+            try:
+                self.backlog = self.ser.in_waiting
+                chunk = self.ser.read(max(1, self.backlog))
+            except (serial.serialutil.SerialException, OSError) as e:
+                if self.running.is_set():
+                    self.logger.error("Reading from the serial port failed: %s" % e)
+                    self.stop()
+                break
+
+            if len(chunk) == 0:
+                continue
+
+            pending += chunk
+            self.received = time.time() * 1000
+            start = time.perf_counter()
+
+            if self.binary:
+                self.parse_frames(pending)
+            else:
+                lines = pending.split(b"\n")
+                pending = lines.pop() # Last part is an incomplete line (or empty)
+
+                samples = [sample for sample in (self.parse(bytes(line)) for line in lines) if sample is not None]
+
+                if len(samples) > 0:
+                    offset = self.align(samples[-1][0])
+                    kept = [sample for sample in samples if sample[0] + offset >= 0]
+
+                    if len(kept) < len(samples):
+                        self.drop_early(len(samples) - len(kept))
+
+                    for timestamp, pin, res_val in kept:
+                        self.rings[pin].push(timestamp + offset, res_val)
+
+            self.parse_time += time.perf_counter() - start
+
+    # Decode all complete binary frames at once, removes them from pending
+    def parse_frames(self, pending):
+        times, pins, vals, consumed, skipped = protocol.decode(pending)
+        del pending[:consumed]
+
+        if skipped > 0:
+            self.faulty += 1
+            self.logger.warning("Faulty serial communication: skipped %i bytes" % skipped, key="Faulty serial communication")
+
+        # A valid frame for a pin this board doesn't have counts as faulty, same as such a line in text mode
+        unknown = (pins >= len(self.rings))
+
+        if unknown.any():
+            self.faulty += int(unknown.sum())
+            self.logger.warning("Faulty serial communication: %i frame(s) for unknown pins" % unknown.sum(), key="Faulty serial communication")
+            times, pins, vals = times[~unknown], pins[~unknown], vals[~unknown]
+
+        if len(times) == 0:
+            return
+
+        times = times + self.align(times[-1])
+        early = (times < 0)
+
+        if early.any():
+            self.drop_early(int(early.sum()))
+
+        for pin in range(0, len(self.rings)):
+            mask = (pins == pin) & ~early
+
+            if mask.any():
+                self.rings[pin].push_many(times[mask], vals[mask])
+
+    # Returns (timestamp, pin, readout), or None for an empty or faulty line
+    def parse(self, line):
+        line = line.rstrip()
+
+        if len(line) == 0:
+            return None
+
+        unpack = line.split(b",")
+
+        if len(unpack) != 3: # We expect 3 variables. No more, no less
+            return None
+
+        try:
+            timestamp = int(unpack[0])
+            pin = int(unpack[1])
+            res_val = int(unpack[2])
+        except ValueError:
+            pin = -1
+
+        # A lost line ending glues two lines together, e.g. "1000,0,512600", so the readout (10 bit ADC) and time (millis())
+        # are checked too: anything out of range would not fit the ring buffers
+        if 0 <= pin < len(self.rings) and 0 <= res_val <= 1023 and 0 <= timestamp <= 0xFFFFFFFF:
+            return (timestamp, pin, res_val)
+
+        self.faulty += 1
+        self.logger.warning("Faulty serial communication: %s" % line.decode(errors="replace"), key="Faulty serial communication")
+
+        return None
+
+    # Offset for the timestamps of this board
+    def align(self, timestamp):
+        if self.offset is None:
+            self.offset = self.clock.offset(self.board, timestamp, self.received)
+            self.logger.log("Board %i: clock offset %+i ms" % (self.board, self.offset))
+
+        return self.offset
+
+    # Measurements a board buffered from before the first board's clock started would get a negative time,
+    # which the recordings can't store
+    def drop_early(self, n):
+        self.logger.warning("Board %i: dropped %i measurements from before the first board started" % (self.board, n), \
+                            key="Board %i: dropped measurements" % self.board)
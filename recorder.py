@@ -0,0 +1,547 @@
+"""
+    recorder.py
+    Created by Floris P.J. den Hartog, 2018
+
+    Headless recording, without the Tk GUI: reads the Arduino at full rate and writes the data and annotation files
+    The connection, handshake and file naming are shared with main.py, so recordings look the same either way
+
+    The GUI can attach as a viewer: the recorder acts like an Arduino on a local socket (same start-up lines and
+    optional binary handshake), so in main.py use e.g. "socket://localhost:5760" as the COM port
+    Annotations made in the GUI (space bar) are sent to the recorder and saved in its annotation file
+
+    Usage: python recorder.py --port COM4 --pins 0,1,2 [--binary] [--format Binary] [--serve 5760] [--duration 1800]
+    Several Arduinos are recorded into one file with e.g. --port "COM4;COM5" (see writer.py for the channel numbers)
+    Type a message and press enter to add an annotation, stop with Ctrl+C
+"""
+
+import sys, time, argparse, signal, socket, threading, queue, serial
+import numpy as np
+import logger, buffers, reader, writer, recording, protocol, simulator, metrics
+from utils import millis, touch
+
+ANNOTATE = b"ANNOTATE " # Viewers send annotations as "ANNOTATE time,message\n"
+VIEWER_QUEUE = 100 # Batches waiting per viewer, a viewer that falls further behind misses data (the recording never waits)
+VIEWER_GREETING = 0.2 # Seconds before the start-up lines go to a new viewer, pyserial's socket:// discards what comes in while it opens
+PORT_SEPARATOR = ";" # Several boards are recorded at once with e.g. "COM4;COM5"
+
+def split_ports(setting):
+    return [port.strip() for port in setting.split(PORT_SEPARATOR) if port.strip() != ""]
+
+# Names of the channels (see writer.py): "A0" etc. for a single board, "B0 A0", "B1 A0" etc. for several
+def channel_names(boards, pins):
+    if boards == 1:
+        return ["A%i" % pin for pin in range(pins)]
+
+    return ["B%i A%i" % divmod(channel, pins) for channel in range(boards * pins)]
+
+# Open a COM port, "SIM" runs a simulated Arduino (see simulator.py), URLs like "socket://localhost:5760" attach to a recorder
+def open_port(port, baud, freq, pins):
+    if port.upper().startswith("SIM"):
+        return simulator.open_port(port, freq=freq, pins=pins)
+
+    if "://" in port:
+        return serial.serial_for_url(port, baud)
+
+    return serial.Serial(port, baud)
+
+# Wait for INIT_COMPLETE and, if binary, ask the Arduino to send binary frames (see protocol.py)
+# idle() is called while waiting, returning False cancels. Returns (initialized, binary mode, amount of pins initialized)
+def handshake(ser, log, binary=False, timeout=5, idle=lambda: True):
+    timer = millis()
+    pins = 0
+
+    while True:
+        if not idle():
+            return False, False, pins
+
+        try:
+            data_in = ser.readline()
+        except Exception as e:
+            log.error(e)
+            data_in = b""
+
+        if len(data_in) > 0:
+            try:
+                data_in = data_in.decode().rstrip()
+
+                if data_in.startswith("Initialized on pin"):
+                    pins += 1
+                elif data_in == "INIT_COMPLETE":
+                    return True, binary and request_binary(ser, log), pins
+            except Exception as e:
+                log.error(e)
+
+        if (millis() - timer) >= (timeout * 1000):
+            log.error("Arduino failed to initialize after %i sec" % timeout)
+            return False, False, pins
+
+# Older sketches just keep sending text
+def request_binary(ser, log):
+    ser.timeout = 1
+
+    try:
+        ser.write(protocol.REQUEST)
+        reply = ser.readline().decode(errors="replace").rstrip()
+    except Exception as e:
+        log.error(e)
+        reply = ""
+
+    if reply == protocol.ACK:
+        log.log("Using the binary serial protocol")
+        return True
+
+    log.log("Arduino did not switch to the binary serial protocol, using text")
+    return False
+
+# Data and annotation file of recording number of the session started at started (sec)
+def file_names(started, number, binary_file=False):
+    return "sensordata/data_%i_%i%s" % (started, number, recording.EXTENSION if binary_file else ".txt"), \
+           "sensordata/annotations_%i_%i.txt" % (started, number)
+
+# Generate new, empty data and annotation files, returns the writer for the data
+# Several boards are merged into one recording, with the times of all boards on the clock of the first (see reader.clockAlignment)
+def open_recording(save_file, annotation_file, Vcc, pulldown, freq, baud, started, binary_file=False, boards=1, pins=writer.BOARD_PINS):
+    if binary_file:
+        out = recording.recordingWriter(save_file, Vcc, pulldown, freq, baud, started, boards=boards, pins=pins)
+    else:
+        out = writer.dataWriter(save_file, boards=boards, pins=pins)
+
+    touch(annotation_file)
+
+    out.write("; Recording @ %i Hz, Baud rate %i\n" % (freq, baud))
+    out.write("; Vcc = %.02f V, pulldown = %i Ohm\n" % (Vcc, pulldown))
+
+    if boards > 1:
+        out.write("; Boards: %i x %i pins\n" % (boards, pins))
+        out.write("; Key: time (ms), board (0-%i), pin (A0-%i), readout (0-1023)\n" % (boards - 1, pins - 1))
+    else:
+        out.write("; Key: time (ms), pin (A0-5), readout (0-1023)\n")
+
+    return out
+
+def save_annotation(file, t, msg):
+    with open(file, "a") as fh:
+        fh.write("%s,%s\n" % (t, msg))
+
+# A viewer (e.g. the GUI) connected to the recorder, gets the measurements like it would from the Arduino
+class viewerConnection(threading.Thread):
+    def __init__(self, conn, address, num_pins, log, annotate):
+        threading.Thread.__init__(self, daemon=True)
+
+        self.conn = conn
+        self.address = address
+        self.num_pins = num_pins
+        self.logger = log
+        self.annotate = annotate # Called with (time, message) for every annotation the viewer sends
+
+        self.binary = False
+        self.ready = threading.Event() # Set once the handshake is done
+        self.queue = queue.Queue(maxsize=VIEWER_QUEUE)
+        self.dropped = 0 # Batches the viewer missed because it fell behind
+        self.running = threading.Event()
+        self.running.set()
+
+    # Queue measurements (arrays) for the viewer, never blocks
+    def send(self, times, pins, vals):
+        if not self.ready.is_set():
+            return
+
+        try:
+            self.queue.put_nowait((times, pins, vals))
+        except queue.Full:
+            self.dropped += 1
+            self.logger.warning("Viewer %s:%i is falling behind, skipping data" % self.address[:2], key="Viewer falling behind")
+
+    def stop(self):
+        self.running.clear()
+
+    def encode(self, times, pins, vals):
+        if self.binary:
+            return protocol.encode_many(times, pins, vals)
+
+        return "".join("%i,%i,%i\r\n" % line for line in zip(times.tolist(), pins.tolist(), vals.tolist())).encode()
+
+    # Annotation lines, returns what is left of an incomplete line
+    def receive(self, pending):
+        lines = pending.split(b"\n")
+
+        for line in lines[:-1]:
+            line = line.rstrip()
+
+            if not line.startswith(ANNOTATE) or b"," not in line:
+                continue
+
+            t, msg = line[len(ANNOTATE):].decode(errors="replace").split(",", 1)
+
+            try:
+                self.annotate(int(t), msg)
+            except ValueError:
+                self.logger.warning("Faulty annotation from viewer %s:%i: %s" % (self.address[:2] + (line.decode(errors="replace"),)))
+
+        return lines[-1]
+
+    # Whether the data sent in the request window holds the binary request (at the start of a line, annotation lines
+    # start with ANNOTATE), returns that and the data without the request
+    def take_request(self, pending):
+        lines = pending.split(b"\n")
+
+        for i, line in enumerate(lines):
+            if line.startswith(protocol.REQUEST):
+                lines[i] = line[len(protocol.REQUEST):]
+                return True, b"\n".join(lines)
+
+        return False, pending
+
+    def run(self):
+        pending = b""
+
+        try:
+            # Same start-up as extract.ino, including the window for requesting the binary protocol
+            time.sleep(VIEWER_GREETING)
+            self.conn.sendall(b" \r\n" + b"".join(b"Initialized on pin %i\r\n" % pin for pin in range(self.num_pins)) + b"INIT_COMPLETE\r\n")
+            deadline = time.perf_counter() + protocol.MODE_TIMEOUT
+
+            # Everything the viewer sends in the window is kept, it may send an annotation before or after the request
+            while time.perf_counter() < deadline:
+                self.conn.settimeout(max(deadline - time.perf_counter(), 0.001))
+
+                try:
+                    data = self.conn.recv(4096)
+                except socket.timeout:
+                    break
+
+                if len(data) == 0: # Viewer disconnected, noticed below
+                    break
+
+                pending += data
+
+            self.binary, pending = self.take_request(pending)
+
+            if self.binary:
+                self.conn.sendall(b"%s\r\n" % protocol.ACK.encode())
+
+            pending = self.receive(pending)
+            self.ready.set()
+            self.conn.settimeout(0.05)
+
+            while self.running.is_set():
+                batches = []
+
+                while True:
+                    try:
+                        batches.append(self.queue.get_nowait())
+                    except queue.Empty:
+                        break
+
+                if len(batches) > 0:
+                    self.conn.sendall(b"".join(self.encode(*batch) for batch in batches))
+
+                try:
+                    data = self.conn.recv(4096)
+                except socket.timeout:
+                    continue
+
+                if len(data) == 0: # Viewer disconnected
+                    break
+
+                pending = self.receive(pending + data)
+
+            self.logger.log("Viewer %s:%i disconnected" % self.address[:2])
+        except OSError as e:
+            if self.running.is_set():
+                self.logger.log("Viewer %s:%i disconnected (%s)" % (self.address[:2] + (e,)))
+        finally:
+            self.ready.clear()
+            self.conn.close()
+
+# Accepts viewers on a local socket
+class viewerServer(threading.Thread):
+    def __init__(self, address, num_pins, log, annotate):
+        threading.Thread.__init__(self, daemon=True)
+
+        self.num_pins = num_pins
+        self.logger = log
+        self.annotate = annotate
+        self.viewers = []
+
+        self.sock = socket.create_server(address)
+        self.sock.settimeout(0.5)
+        self.address = self.sock.getsockname()
+
+        self.running = threading.Event()
+        self.running.set()
+
+    def run(self):
+        while self.running.is_set():
+            try:
+                conn, address = self.sock.accept()
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+
+            self.logger.log("Viewer %s:%i connected" % address[:2])
+
+            viewer = viewerConnection(conn, address, self.num_pins, self.logger, self.annotate)
+            viewer.start()
+
+            self.viewers = [v for v in self.viewers if v.is_alive()] + [viewer]
+
+    # Measurements of all pins, for every connected viewer
+    def send(self, times, pins, vals):
+        for viewer in self.viewers:
+            viewer.send(times, pins, vals)
+
+    def stop(self):
+        self.running.clear()
+        self.sock.close()
+
+        for viewer in self.viewers:
+            viewer.stop()
+
+class headlessRecorder:
+    # port can hold several boards, e.g. "COM4;COM5", channels are the channels (see writer.py) to save
+    def __init__(self, port, channels=None, baud=128000, freq=10, num_pins=6, binary=False, binary_file=False, Vcc=5.06, pulldown=10000, \
+                 serve=None, init_timeout=5, status_interval=60, metrics_csv=False):
+        self.__start__ = time.time()
+
+        self.ports = split_ports(port)
+        self.boards = max(len(self.ports), 1)
+        self.baud = baud
+        self.freq = freq
+        self.num_pins = num_pins # Pins per board
+        self.num_channels = self.boards * num_pins
+        self.channels = sorted(channels) if channels is not None else list(range(self.num_channels)) # All channels are sent to the viewers
+        self.names = channel_names(self.boards, num_pins)
+        self.binary = binary # Ask the Arduino for the binary protocol
+        self.binary_file = binary_file # Save as .fsr instead of text (see recording.py)
+        self.Vcc = Vcc
+        self.pulldown = pulldown
+        self.serve = serve # (host, port) to accept viewers on, or None
+        self.init_timeout = init_timeout
+        self.status_interval = status_interval # Seconds between the metrics lines in the log
+        self.metrics_csv = metrics_csv
+
+        self.logger = logger.logger("logs/log_%i.txt" % self.__start__, self.__start__)
+        self.recordings = 0
+        self.sers = [] # Serial connection per board
+        self.serial_readers = [] # Reader thread per board, all feeding self.rings
+        self.server = None
+        self.writer = None
+        self.metrics = None
+        self.last_time = None # Newest timestamp received, for annotations typed in the terminal
+        self.lock = threading.Lock() # Annotations come from the viewer and terminal threads
+        self.running = threading.Event()
+
+        self.rings = [buffers.sampleRing(max(10000, freq * 10)) for i in range(0, self.num_channels)]
+
+    # Open the port of a board, waiting for it to be connected, returns None if stopped before that
+    def connect(self, port):
+        timer = millis()
+
+        while self.running.is_set():
+            try:
+                return open_port(port, self.baud, self.freq, self.num_pins)
+            except serial.SerialException:
+                if (millis() - timer) >= 1000: # Give an error every second
+                    self.logger.warning("Connect Arduino to USB! (%s)" % port, key="Connect Arduino to USB!")
+                    timer = millis()
+
+                time.sleep(0.1)
+
+        return None
+
+    # Connect to the Arduino(s) and start recording, returns False if one did not initialize
+    def start(self):
+        self.running.set()
+        modes = []
+
+        for port in self.ports:
+            ser = self.connect(port)
+            if ser is None:
+                self.close_ports()
+                return False
+
+            self.sers.append(ser)
+
+            initialized, binary_mode, pins = handshake(ser, self.logger, self.binary, self.init_timeout, idle=self.running.is_set)
+            if not initialized:
+                self.logger.error("Connection failed (%s)" % port)
+                self.close_ports()
+                return False
+
+            modes.append(binary_mode)
+
+        self.recordings += 1
+        self.SAVE_FILE, self.ANNOTATION_FILE = file_names(self.__start__, self.recordings, self.binary_file)
+        self.writer = open_recording(self.SAVE_FILE, self.ANNOTATION_FILE, self.Vcc, self.pulldown, self.freq, self.baud, \
+                                     self.__start__, self.binary_file, self.boards, self.num_pins)
+
+        self.logger.log("Arduino%s initialized, starting recording #%i of this session" % ("s" if self.boards > 1 else "", self.recordings))
+        self.logger.log("Currently recording to file: %s" % self.SAVE_FILE)
+
+        if len(self.channels) > 0:
+            self.logger.log("Recording from pin%s %s" % ("s" if len(self.channels) > 1 else "", ", ".join(self.names[i] for i in self.channels)))
+        else:
+            self.logger.warning("No data is being saved! Use --pins to select the pin(s) you wish to record.")
+
+        self.metrics = metrics.loopMetrics(self.num_channels, 1000 / self.freq, \
+                                           "logs/metrics_%i_%i.csv" % (self.__start__, self.recordings) if self.metrics_csv else None, \
+                                           interval=self.status_interval, names=self.names)
+
+        clock = reader.clockAlignment() if self.boards > 1 else None
+
+        for board, ser in enumerate(self.sers):
+            rings = self.rings[board * self.num_pins:(board + 1) * self.num_pins]
+            self.serial_readers.append(reader.serialReader(ser, rings, self.logger, binary=modes[board], board=board, clock=clock))
+            self.serial_readers[-1].start()
+
+        if self.serve is not None:
+            self.server = viewerServer(self.serve, self.num_channels, self.logger, self.annotate)
+            self.server.start()
+            self.logger.log("Viewers can attach at socket://%s:%i" % self.server.address[:2])
+
+        return True
+
+    # Save (and pass on to the viewers) everything received since the previous step
+    def step(self):
+        batches = []
+
+        for channel in range(0, self.num_channels):
+            times, values = self.rings[channel].pull()
+
+            if len(times) == 0:
+                continue
+
+            self.metrics.count(channel, times)
+            self.last_time = times[-1] if self.last_time is None else max(self.last_time, times[-1])
+
+            if channel in self.channels:
+                with self.metrics.timer("save"):
+                    self.writer.write_samples(channel, times, values)
+
+            batches.append((times, np.full(len(times), channel), values))
+
+        with self.metrics.timer("save"):
+            self.writer.check()
+
+        if self.server is not None and len(batches) > 0:
+            self.server.send(*(np.concatenate(column) for column in zip(*batches)))
+
+        if self.metrics.due():
+            snap = self.metrics.snapshot(self.serial_readers, self.rings)
+            self.logger.log("%i measurements saved, %s" % \
+                            (self.writer.records, self.metrics.text(snap, self.channels).replace("\n", ", ")))
+
+    # Record until stopped (or for duration sec), step every interval sec
+    def run(self, duration=None, interval=0.1):
+        end = None if duration is None else time.time() + duration
+
+        while self.running.is_set() and (end is None or time.time() < end):
+            time.sleep(interval)
+            self.step()
+
+            if not all(serial_reader.is_alive() for serial_reader in self.serial_readers):
+                self.logger.error("Lost the connection to the Arduino")
+                break
+
+        self.stop()
+
+    # Can be called from any thread (or a signal handler), run() then finishes the recording
+    def interrupt(self):
+        self.running.clear()
+
+    def stop(self):
+        self.running.clear()
+
+        if self.server is not None:
+            self.server.stop()
+            self.server = None
+
+        if len(self.serial_readers) > 0:
+            for serial_reader in self.serial_readers:
+                serial_reader.stop()
+                serial_reader.join()
+
+            self.step() # What was received after the last step
+            self.serial_readers = []
+
+        if self.writer is not None:
+            try:
+                self.writer.close()
+            except Exception as e:
+                self.logger.error("Error saving data %s" % e, key="Error saving data")
+
+            self.logger.log("Stopping recording, saved %i measurements (%i lines, %i bytes written)" % \
+                            (self.writer.records, self.writer.lines_written, self.writer.bytes_written))
+            self.writer = None
+
+        if self.metrics is not None:
+            self.metrics.close()
+
+        self.close_ports()
+
+    def close_ports(self):
+        for ser in self.sers:
+            try:
+                ser.close()
+            except Exception as e:
+                self.logger.error(e)
+
+        self.sers = []
+
+    def annotate(self, t, msg):
+        with self.lock:
+            try:
+                save_annotation(self.ANNOTATION_FILE, t, msg)
+            except Exception as e:
+                self.logger.error("Error saving data %s" % e, key="Error saving data")
+
+        self.logger.log("Annotation @ %i ms: %s" % (t, msg))
+
+    # Every line typed in the terminal is an annotation at the newest timestamp received
+    def read_annotations(self, stream):
+        for line in stream:
+            msg = line.rstrip("\r\n")
+
+            if self.last_time is None or not self.running.is_set():
+                self.logger.warning("Annotation ignored, %s: %s" % ("not recording" if not self.running.is_set() else "no measurements yet", msg))
+                continue
+
+            self.annotate(int(self.last_time), msg)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Record from the Arduino without the GUI")
+    parser.add_argument("--port", default="COM4", help="COM port, SIM for the simulated Arduino, several boards as COM4;COM5 (default: COM4)")
+    parser.add_argument("--baud", type=int, default=128000, help="baud rate (default: 128000)")
+    parser.add_argument("--freq", type=int, default=10, help="measurement frequency of the Arduino in Hz (default: 10)")
+    parser.add_argument("--pins", default=None, help="pins to save, e.g. 0,1,2, with several boards 6 is A0 of the second board (default: all)")
+    parser.add_argument("--binary", action="store_true", help="ask the Arduino for the binary serial protocol")
+    parser.add_argument("--format", choices=["Text", "Binary"], default="Text", help="save as (default: Text)")
+    parser.add_argument("--vcc", type=float, default=5.06, help="Vcc (default: 5.06)")
+    parser.add_argument("--pulldown", type=int, default=10000, help="pulldown resistor in Ohm (default: 10000)")
+    parser.add_argument("--duration", type=float, default=None, help="stop after this many seconds (default: until Ctrl+C)")
+    parser.add_argument("--serve", type=int, default=None, metavar="PORT", help="accept viewers on localhost:PORT")
+    parser.add_argument("--host", default="localhost", help="address to accept viewers on (default: localhost)")
+    parser.add_argument("--status", type=float, default=60, help="seconds between the status lines in the log (default: 60)")
+    parser.add_argument("--metrics-csv", action="store_true", help="also save the status per interval to logs/metrics_*.csv")
+    args = parser.parse_args()
+
+    channels = None if args.pins is None else [int(pin) for pin in args.pins.split(",") if pin.strip() != ""]
+
+    rec = headlessRecorder(args.port, channels, args.baud, args.freq, binary=args.binary, binary_file=(args.format == "Binary"), \
+                           Vcc=args.vcc, pulldown=args.pulldown, serve=None if args.serve is None else (args.host, args.serve), \
+                           status_interval=args.status, metrics_csv=args.metrics_csv)
+
+    signal.signal(signal.SIGINT, lambda signum, frame: rec.interrupt())
+    signal.signal(signal.SIGTERM, lambda signum, frame: rec.interrupt())
+
+    if not rec.start():
+        rec.logger.close()
+        sys.exit(1)
+
+    if sys.stdin is not None and sys.stdin.isatty():
+        threading.Thread(target=rec.read_annotations, args=(sys.stdin,), daemon=True).start()
+
+    rec.run(args.duration)
+    rec.logger.close()
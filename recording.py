@@ -0,0 +1,125 @@
+"""
+    recording.py
+    Created by Floris P.J. den Hartog, 2018
+
+    Binary recording format, an alternative to the sensordata/*.txt files
+    A 64 byte header with the recording settings, followed by fixed-width records:
+      time (ms, uint32), pin (uint8), readout (uint16), all little endian
+    Version 2 merges several Arduinos (see the boards and pins in the header), its records have a board (uint8) before the pin
+
+    The records can be memory-mapped, so even long recordings load instantly as NumPy arrays
+    Usage for converting text recordings: python recording.py sensordata/data_1554215695_4.txt [...]
+"""
+
+import sys, os, re, time
+import numpy as np
+import writer
+
+MAGIC = b"FSRREC\x00\x01"
+VERSION = 1
+VERSION_BOARDS = 2 # Used for recordings of more than 1 board
+EXTENSION = ".fsr"
+
+HEADER = np.dtype([("magic", "S8"), ("version", "<u2"), ("Vcc", "<f8"), ("pulldown", "<u4"), ("freq", "<u4"), \
+                   ("baud", "<u4"), ("started", "<f8"), ("boards", "u1"), ("pins", "u1"), ("reserved", "V24")])
+RECORD = np.dtype([("time", "<u4"), ("pin", "u1"), ("value", "<u2")])
+RECORD_BOARDS = np.dtype([("time", "<u4"), ("board", "u1"), ("pin", "u1"), ("value", "<u2")])
+
+class recordingWriter(writer.dataWriter):
+    def __init__(self, file, Vcc, pulldown, freq, baud, started=None, **kwargs):
+        writer.dataWriter.__init__(self, file, **kwargs)
+
+        header = np.zeros(1, dtype=HEADER)
+        header["magic"] = MAGIC
+        header["version"] = VERSION if self.boards == 1 else VERSION_BOARDS
+        header["boards"] = self.boards
+        header["pins"] = self.pins
+        header["Vcc"] = Vcc
+        header["pulldown"] = pulldown
+        header["freq"] = freq
+        header["baud"] = baud
+        header["started"] = started if started is not None else time.time()
+
+        self.fh.write(header.tobytes())
+        self.fh.flush()
+        self.bytes_written += HEADER.itemsize
+
+    # Comments have no place in a binary recording, the settings are in the header
+    def write(self, data, records=0):
+        pass
+
+    def write_samples(self, channel, times, values):
+        records = np.zeros(len(times), dtype=RECORD if self.boards == 1 else RECORD_BOARDS)
+        records["time"] = times
+        records["value"] = values
+
+        if self.boards == 1:
+            records["pin"] = channel
+        else:
+            records["board"], records["pin"] = divmod(channel, self.pins)
+
+        self.queue(records.tobytes(), len(records), len(records))
+
+# Header (as a dict) and the records (memory-mapped, use e.g. records["time"]) of a binary recording
+def load(file):
+    header = np.fromfile(file, dtype=HEADER, count=1)
+
+    if len(header) == 0 or header["magic"][0] != MAGIC:
+        raise ValueError("%s is not a binary recording" % file)
+
+    header = {name: header[name][0].item() for name in ("version", "Vcc", "pulldown", "freq", "baud", "started", "boards", "pins")}
+
+    # Version 1 left these empty
+    header["boards"] = max(header["boards"], 1)
+    header["pins"] = header["pins"] if header["pins"] > 0 else writer.BOARD_PINS
+
+    record = RECORD if header["version"] < VERSION_BOARDS else RECORD_BOARDS
+
+    # An interrupted recording can end with a partial record, leave it out
+    count = (os.path.getsize(file) - HEADER.itemsize) // record.itemsize
+    if count == 0:
+        return header, np.zeros(0, dtype=record)
+
+    return header, np.memmap(file, dtype=record, mode="r", offset=HEADER.itemsize, shape=(count,))
+
+# Channel of every record (board * pins + pin, the pin for a single board)
+def channels(header, records):
+    if "board" not in records.dtype.names:
+        return records["pin"].astype(np.int64)
+
+    return records["board"].astype(np.int64) * header["pins"] + records["pin"]
+
+# Convert a text recording (including the settings in its ; comments) to the binary format
+def convert(file, out=None):
+    if out is None:
+        out = os.path.splitext(file)[0] + EXTENSION
+
+    import loader # loader reads .fsr files through this module, so it is only imported here
+
+    settings, times, channels, values = loader.read_text(file)
+    settings = dict({"Vcc": 0.0, "pulldown": 0, "freq": 0, "baud": 0, "boards": 1, "pins": writer.BOARD_PINS}, **settings)
+
+    # The text files are named data_<session start>_<recording #>.txt
+    m = re.search(r"data_(\d+)_\d+", os.path.basename(file))
+    started = float(m.group(1)) if m is not None else os.path.getmtime(file)
+
+    rec = recordingWriter(out, settings["Vcc"], settings["pulldown"], settings["freq"], settings["baud"], started, \
+                          boards=settings["boards"], pins=settings["pins"])
+
+    records = np.zeros(len(times), dtype=RECORD if rec.boards == 1 else RECORD_BOARDS)
+    records["time"] = times
+    records["value"] = values
+
+    if rec.boards == 1:
+        records["pin"] = channels
+    else:
+        records["board"], records["pin"] = np.divmod(channels, rec.pins)
+
+    rec.queue(records.tobytes(), len(records), len(records))
+    rec.close()
+
+    return out
+
+if __name__ == "__main__":
+    for file in sys.argv[1:]:
+        print("%s -> %s" % (file, convert(file)))
@@ -0,0 +1,93 @@
+"""
+    rolling.py
+    Created by Floris P.J. den Hartog, 2018
+
+    (Moving) averages over recorded data, computed with cumulative sums
+    All results are aligned with the input: element i is the average up to and including sample i
+"""
+
+import numpy as np
+
+# Average of all samples up to and including i
+def expanding_average(x):
+    x = np.asarray(x, dtype=np.float64)
+
+    return np.cumsum(x) / np.arange(1, len(x) + 1)
+
+# Moving averages for several window sizes (samples) at once, one row per window, NaN until the window is filled
+def moving_average(x, windows):
+    x = np.asarray(x, dtype=np.float64)
+    windows = np.atleast_1d(windows)
+
+    csum = np.concatenate(([0.0], np.cumsum(x)))
+    out = np.full((len(windows), len(x)), np.nan)
+
+    for i, n in enumerate(windows):
+        if 0 < n <= len(x):
+            out[i, n - 1:] = (csum[n:] - csum[:-n]) / n
+
+    return out
+
+SMOOTHING = ("causal", "centered", "filtfilt", "savgol")
+
+# Boxcar sums of n samples ending at every sample, along the last axis (zeros before the start, like lfilter)
+def _boxcar_sums(x, n):
+    csum = np.cumsum(x, axis=-1)
+    out = csum.copy()
+    out[..., n:] -= csum[..., :-n]
+
+    return out
+
+# Mirror n samples around both ends (odd extension, as scipy.signal.filtfilt does), so zero-phase filters don't sag at the edges
+def _extend(x, n):
+    n = min(n, x.shape[-1] - 1)
+    if n < 1:
+        return x, 0
+
+    left = 2 * x[..., :1] - x[..., n:0:-1]
+    right = 2 * x[..., -1:] - x[..., -2:-n - 2:-1]
+
+    return np.concatenate((left, x, right), axis=-1), n
+
+# Smooth every row of x (or a single series) with a window of n samples, in O(len) per row:
+#   "causal": moving average over the last n samples, same as lfilter([1 / n] * n, 1, x) (lags n / 2 samples)
+#   "centered": moving average over n samples around each sample (zero-phase, shorter windows at the edges)
+#   "filtfilt": causal moving average forwards and backwards (zero-phase, like scipy.signal.filtfilt)
+#   "savgol": Savitzky-Golay filter of order polyorder (zero-phase, keeps peaks), mirrored at the edges, using an FFT convolution
+def smooth(x, n, method="causal", polyorder=3):
+    x = np.asarray(x, dtype=np.float64)
+    n = int(n)
+
+    if n <= 1 or x.shape[-1] == 0:
+        return x.copy()
+
+    if method == "causal":
+        return _boxcar_sums(x, n) / n
+    elif method == "centered":
+        L = x.shape[-1]
+        start = np.clip(np.arange(L) - n // 2, 0, L)
+        end = np.clip(np.arange(L) + (n - n // 2), 0, L)
+
+        csum = np.concatenate((np.zeros(x.shape[:-1] + (1,)), np.cumsum(x, axis=-1)), axis=-1)
+
+        return (csum[..., end] - csum[..., start]) / (end - start)
+    elif method == "filtfilt":
+        padded, pad = _extend(x, n)
+        y = _boxcar_sums(_boxcar_sums(padded, n)[..., ::-1] / n, n)[..., ::-1] / n
+
+        return y[..., pad:pad + x.shape[-1]]
+    elif method == "savgol":
+        from scipy.signal import savgol_coeffs, fftconvolve
+
+        L = x.shape[-1]
+        n = min(n | 1, L if L % 2 else L - 1) # Odd, at most the length
+        if n <= polyorder:
+            return x.copy()
+
+        padded, pad = _extend(x, n // 2)
+        coeffs = savgol_coeffs(n, polyorder, use="conv")
+        y = fftconvolve(padded, coeffs.reshape((1,) * (x.ndim - 1) + (-1,)), mode="same", axes=-1)
+
+        return y[..., pad:pad + x.shape[-1]]
+
+    raise ValueError("Unknown smoothing %r, use one of %s" % (method, SMOOTHING))
@@ -0,0 +1,133 @@
+"""
+    running.py
+    Created by Floris P.J. den Hartog, 2018
+
+    Running statistics for the live graph, updated in constant time per sample
+"""
+
+import numpy as np
+from collections import deque
+
+class runningStats:
+    def __init__(self, calc, mavg_n):
+        # One row per readout (0-1023): voltage (mV), resistance (Ohm), conductance (uS)
+        self.rows = np.column_stack((calc.tables["volts"] * 1000, calc.tables["resists"], calc.tables["conds"] * 10**6))
+
+        self.mavg_n = mavg_n # Window of the moving average (samples)
+        self.alpha = 2 / (mavg_n + 1) # Smoothing factor of the exponential moving average, same "span" as the moving average
+
+        self.reset()
+
+    def reset(self):
+        self.count = 0
+        self.sum = np.zeros(3) # Sum over every sample currently in the graph window
+        self.ema = np.zeros(3)
+
+        self.recent = np.zeros(self.mavg_n, dtype=np.int64) # Last mavg_n readouts, circular
+        self.recent_count = 0
+        self.recent_sum = np.zeros(3)
+
+    # Readouts outside of 0-1023 are clipped, same as calculations.convert (a negative one would index from the end)
+    def clip(self, val):
+        return min(max(int(val), 0), len(self.rows) - 1)
+
+    # Add a new readout
+    def push(self, val):
+        val = self.clip(val)
+        row = self.rows[val]
+
+        self.count += 1
+        self.sum += row
+
+        if self.count == 1:
+            self.ema = row.copy()
+        else:
+            self.ema += self.alpha * (row - self.ema)
+
+        i = self.recent_count % self.mavg_n
+        if self.recent_count >= self.mavg_n:
+            self.recent_sum -= self.rows[self.recent[i]]
+
+        self.recent[i] = val
+        self.recent_count += 1
+        self.recent_sum += row
+
+    # Remove a readout that dropped out of the graph window
+    def evict(self, val):
+        self.count -= 1
+        self.sum -= self.rows[self.clip(val)]
+
+    def average(self):
+        return self.sum / self.count if self.count > 0 else np.zeros(3)
+
+    def moving_average(self):
+        n = min(self.recent_count, self.mavg_n)
+        return self.recent_sum / n if n > 0 else np.zeros(3)
+
+    # Start over from the readouts currently in the window, e.g. after changing the moving average window
+    def rebuild(self, vals, mavg_n=None):
+        if mavg_n is not None:
+            self.mavg_n = mavg_n
+            self.alpha = 2 / (mavg_n + 1)
+
+        self.reset()
+        for val in vals:
+            self.push(val)
+
+class windowExtrema:
+    def __init__(self, size):
+        self.size = size # Window size (samples)
+        self.reset()
+
+    def reset(self):
+        self.count = 0
+        self.peak = None # Highest value since the last reset, also outside of the window
+
+        # Monotonic queues of (sample number, value): the first item is always the min/max of the window
+        self.mins = deque()
+        self.maxs = deque()
+
+    def push(self, value):
+        i = self.count
+        self.count += 1
+
+        while len(self.mins) > 0 and self.mins[-1][1] >= value:
+            self.mins.pop()
+
+        while len(self.maxs) > 0 and self.maxs[-1][1] <= value:
+            self.maxs.pop()
+
+        self.mins.append((i, value))
+        self.maxs.append((i, value))
+
+        if self.peak is None or value > self.peak:
+            self.peak = value
+
+        self.evict()
+
+    def extend(self, values):
+        for value in values:
+            self.push(value)
+
+    # Drop the samples that are no longer in the window
+    def evict(self):
+        while self.mins[0][0] <= (self.count - 1 - self.size):
+            self.mins.popleft()
+
+        while self.maxs[0][0] <= (self.count - 1 - self.size):
+            self.maxs.popleft()
+
+    def resize(self, size):
+        self.size = size
+
+        if self.count > 0:
+            self.evict()
+
+    def min(self):
+        return self.mins[0][1] if len(self.mins) > 0 else None
+
+    def max(self):
+        return self.maxs[0][1] if len(self.maxs) > 0 else None
+
+    def __len__(self):
+        return min(self.count, self.size)
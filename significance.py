@@ -0,0 +1,90 @@
+"""
+    significance.py
+    Created by Floris P.J. den Hartog, 2018
+
+    Wilcoxon rank-sum tests between two groups of trials, for every time point (or window) at once
+    Groups are stacked trials: one row per trial, one column per time point (see the statistics in data_view.py)
+"""
+
+import numpy as np
+from scipy.stats import rankdata, norm
+
+CORRECTIONS = (None, "bonferroni", "bh")
+
+# Same test as scipy.stats.ranksums (normal approximation, no tie correction), but for every column of a and b at once
+# Returns the z-statistics and two-sided p-values, one per column
+def ranksums(a, b):
+    n1, n2 = len(a), len(b)
+    ranks = rankdata(np.vstack((a, b)), axis=0)
+
+    s = ranks[:n1].sum(axis=0)
+    expected = n1 * (n1 + n2 + 1) / 2.0
+    z = (s - expected) / np.sqrt(n1 * n2 * (n1 + n2 + 1) / 12.0)
+
+    return z, 2 * norm.sf(np.abs(z))
+
+# The original summary of a window: the single sample right after its start
+# (the first sample of the first window is the baseline itself, 0 for every trial after normalizing)
+def sample(x, axis):
+    return np.take(x, min(1, x.shape[axis] - 1), axis=axis)
+
+# Summary of a window per trial by name: "sample" (see above) or a NumPy function such as "median" or "mean"
+def aggregator(name):
+    return sample if name == "sample" else getattr(np, name)
+
+# Aggregate every window of samples per trial (e.g. the median over each minute), a partial window at the end is left out
+def aggregate(x, window, func=sample):
+    if window <= 1:
+        return x
+
+    n = x.shape[1] // window
+
+    return func(x[:, :n * window].reshape(len(x), n, window), axis=2)
+
+# Correct p-values for multiple comparisons: "bonferroni", "bh" (Benjamini-Hochberg false discovery rate) or None
+def correct(pvals, method=None):
+    pvals = np.asarray(pvals, dtype=np.float64)
+
+    if method is None or len(pvals) == 0:
+        return pvals
+    elif method == "bonferroni":
+        return np.minimum(pvals * len(pvals), 1.0)
+    elif method == "bh":
+        order = np.argsort(pvals)
+        scaled = pvals[order] * len(pvals) / np.arange(1, len(pvals) + 1)
+        scaled = np.minimum.accumulate(scaled[::-1])[::-1] # Adjusted p-values can't decrease with rank
+
+        adjusted = np.empty_like(pvals)
+        adjusted[order] = np.minimum(scaled, 1.0)
+
+        return adjusted
+
+    raise ValueError("Unknown correction %r, use one of %s" % (method, CORRECTIONS))
+
+# Runs of consecutive True values as (start, end) spans, edges has one more element than significant (window boundaries)
+def spans(significant, edges):
+    padded = np.concatenate(([False], significant, [False])).astype(np.int8)
+    changes = np.diff(padded)
+
+    return list(zip(edges[np.flatnonzero(changes == 1)].tolist(), edges[np.flatnonzero(changes == -1)].tolist()))
+
+# Test groups a and b over times (shared time axis), per window of samples (1 = every time point)
+# Returns the times (start of each window), the (corrected) p-values and the spans where p < alpha
+def test(a, b, times, window=1, func=sample, correction=None, alpha=0.05):
+    L = min(a.shape[1], b.shape[1], len(times))
+    window = max(int(window), 1)
+    n = L // window
+
+    if n == 0 or len(a) == 0 or len(b) == 0:
+        return np.zeros(0), np.zeros(0), []
+
+    a = aggregate(a[:, :n * window], window, func)
+    b = aggregate(b[:, :n * window], window, func)
+
+    z, pvals = ranksums(a, b)
+    pvals = correct(pvals, correction)
+
+    times = np.asarray(times)
+    edges = np.append(times[0:n * window:window], times[n * window - 1])
+
+    return edges[:-1], pvals, spans(pvals < alpha, edges)
@@ -0,0 +1,164 @@
+"""
+    simulator.py
+    Created by Floris P.J. den Hartog, 2018
+
+    Software stand-in for an Arduino running extract.ino, to test and benchmark without hardware
+    Acts like a serial port (read, readline, write, in_waiting, timeout): the same start-up lines, INIT_COMPLETE,
+    the optional binary handshake and then "time,pin,value" lines (or binary frames) in real time
+
+    In main.py, use "SIM" as the COM port, options can be added e.g. "SIM:freq=100,pins=6,noise=5,faults=0.01"
+"""
+
+import time, serial
+import numpy as np
+import protocol
+
+class simulatedSerial:
+    # freq: measurements per second per pin, pins: number of pins (A0 and up), noise: standard deviation of the readouts,
+    # faults: fraction of lines (or frames) that arrive corrupted, speed: how much faster than real time the clock runs
+    def __init__(self, freq=10, pins=6, noise=2.0, faults=0.0, speed=1.0, seed=None, timeout=None):
+        self.freq = freq
+        self.pins = pins
+        self.noise = noise
+        self.faults = faults
+        self.speed = speed
+        self.timeout = timeout
+
+        self.random = np.random.default_rng(seed)
+        self.binary = False
+        self.is_open = True
+
+        self.buffer = bytearray(b" \r\n")
+        for pin in range(pins):
+            self.buffer += b"Initialized on pin %i\r\n" % pin
+        self.buffer += b"INIT_COMPLETE\r\n"
+
+        self.opened = time.perf_counter()
+        self.started = None # Measuring starts once the binary mode is settled, like the loop() of extract.ino
+        self.tick = 0 # Next measurement (per pin) to generate
+
+    # Clock of the "Arduino" in ms
+    def millis(self):
+        return (time.perf_counter() - self.opened) * 1000 * self.speed
+
+    # Readouts: a slow breathing-like wave per pin, with noise
+    def readouts(self, times, pins):
+        wave = 400 + 250 * np.sin(2 * np.pi * times / 20000.0 + pins)
+        noise = self.random.normal(0, self.noise, len(times)) if self.noise > 0 else 0
+
+        return np.clip(np.round(wave + noise), 0, 1023).astype(np.int64)
+
+    # Add every measurement that is due by now to the buffer
+    def generate(self):
+        now = self.millis()
+
+        if self.started is None:
+            if now < protocol.MODE_TIMEOUT * 1000:
+                return
+
+            self.started = protocol.MODE_TIMEOUT * 1000
+
+        ticks = int((now - self.started) * self.freq / 1000) + 1
+        if ticks <= self.tick:
+            return
+
+        times = np.repeat((self.started + np.arange(self.tick, ticks) * 1000.0 / self.freq).astype(np.int64), self.pins)
+        pins = np.tile(np.arange(self.pins), ticks - self.tick)
+        vals = self.readouts(times, pins)
+        self.tick = ticks
+
+        if self.binary:
+            data = bytearray(protocol.encode_many(times, pins, vals))
+
+            for i in self.faulty(len(times)):
+                data[i * protocol.FRAME_SIZE + 7] ^= 0xFF # Break the checksum
+        else:
+            lines = ["%i,%i,%i\r\n" % line for line in zip(times.tolist(), pins.tolist(), vals.tolist())]
+
+            for i in self.faulty(len(lines)):
+                lines[i] = "%i,?,%i\r\n" % (times[i], vals[i]) # A glitch in the pin number
+
+            data = "".join(lines).encode()
+
+        self.buffer += data
+
+    # Indices of the measurements that get corrupted
+    def faulty(self, n):
+        if self.faults <= 0:
+            return []
+
+        return np.flatnonzero(self.random.random(n) < self.faults).tolist()
+
+    def check_open(self):
+        if not self.is_open:
+            raise serial.SerialException("Simulated port is closed")
+
+    @property
+    def in_waiting(self):
+        self.check_open()
+        self.generate()
+
+        return len(self.buffer)
+
+    # Wait (up to the timeout) until there is data, or for readline a complete line
+    def wait(self, until):
+        deadline = None if self.timeout is None else time.perf_counter() + self.timeout
+
+        while True:
+            self.check_open()
+            self.generate()
+
+            if until():
+                return True
+
+            if deadline is not None and time.perf_counter() >= deadline:
+                return False
+
+            time.sleep(min(0.5 / (self.freq * self.speed), 0.01))
+
+    def read(self, size=1):
+        self.wait(lambda: len(self.buffer) > 0)
+
+        data = bytes(self.buffer[:size])
+        del self.buffer[:size]
+
+        return data
+
+    def readline(self):
+        self.wait(lambda: b"\n" in self.buffer)
+
+        end = self.buffer.find(b"\n") + 1 if b"\n" in self.buffer else len(self.buffer)
+        data = bytes(self.buffer[:end])
+        del self.buffer[:end]
+
+        return data
+
+    # The host can only switch to binary mode right after INIT_COMPLETE (see extract.ino)
+    def write(self, data):
+        self.check_open()
+
+        if self.started is None and len(data) > 0:
+            self.started = max(self.millis(), 0)
+
+            if data[:1] == protocol.REQUEST:
+                self.binary = True
+                self.buffer += b"%s\r\n" % protocol.ACK.encode()
+
+        return len(data)
+
+    def close(self):
+        self.is_open = False
+
+# Open a simulated port from a COM port setting like "SIM" or "SIM:freq=100,pins=6,noise=5,faults=0.01,speed=1,seed=1"
+def open_port(port, **defaults):
+    options = dict(defaults)
+    spec = port.split(":", 1)[1] if ":" in port else ""
+
+    for option in spec.split(","):
+        if "=" not in option:
+            continue
+
+        key, value = option.split("=", 1)
+        options[key.strip()] = float(value) if key.strip() in ("noise", "faults", "speed") else int(value)
+
+    return simulatedSerial(**options)
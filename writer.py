@@ -0,0 +1,94 @@
+"""
+    writer.py
+    Created by Floris P.J. den Hartog, 2018
+
+    Buffered writer for the data files, keeps the file open and writes in batches
+
+    A recording of several Arduinos is merged into one file, its lines are "time,board,pin,readout"
+    Everywhere else the measurements are numbered by channel: board * pins (per board) + pin
+"""
+
+import time
+
+BOARD_PINS = 6 # Default amount of pins per board (A0-A5)
+
+class dataWriter:
+    def __init__(self, file, boards=1, pins=BOARD_PINS, max_bytes=64 * 1024, max_delay=1.0):
+        self.file = file
+        self.boards = boards # Only with more than 1 board the board is saved, so single board recordings stay "time,pin,readout"
+        self.pins = pins
+        self.max_bytes = max_bytes # Flush when this many bytes are waiting
+        self.max_delay = max_delay # Flush when the oldest waiting line is this many seconds old
+
+        self.pending = []
+        self.pending_bytes = 0
+        self.pending_lines = 0
+        self.pending_records = 0
+        self.pending_since = None
+
+        self.bytes_written = 0 # Everything below is only counted once it is actually on disk
+        self.lines_written = 0
+        self.records = 0 # Lines that are measurements (not ; comments)
+
+        # Generate a new, empty data file, opened in binary so lines end in "\n" on every OS and bytes_written is what is on disk
+        self.fh = open(self.file, "wb")
+
+    # Queue text for writing, may contain multiple lines, records is the amount of them that are measurements (not ; comments)
+    def write(self, data, records=0):
+        self.queue(data.encode(), data.count("\n"), records)
+
+    # Queue measurements of a single channel
+    def write_samples(self, channel, times, values):
+        if self.boards > 1:
+            board, pin = divmod(channel, self.pins)
+            self.write("".join("%i,%i,%i,%i\n" % (t, board, pin, v) for t, v in zip(times.tolist(), values.tolist())), len(times))
+        else:
+            self.write("".join("%i,%i,%i\n" % (t, channel, v) for t, v in zip(times.tolist(), values.tolist())), len(times))
+
+    def queue(self, data, lines, records):
+        if len(data) == 0:
+            return
+
+        self.pending.append(data)
+        self.pending_bytes += len(data)
+        self.pending_lines += lines
+        self.pending_records += records
+
+        if self.pending_since is None:
+            self.pending_since = time.time()
+
+        self.check()
+
+    # Flush if one of the thresholds is hit, also called periodically when no new data comes in
+    def check(self):
+        if len(self.pending) == 0:
+            return
+
+        if (self.pending_bytes >= self.max_bytes) or ((time.time() - self.pending_since) >= self.max_delay):
+            self.flush()
+
+    def flush(self):
+        if self.fh is None or len(self.pending) == 0:
+            return
+
+        data = b"".join(self.pending)
+        self.fh.write(data)
+        self.fh.flush()
+
+        self.bytes_written += len(data)
+        self.lines_written += self.pending_lines
+        self.records += self.pending_records
+
+        self.pending = []
+        self.pending_bytes = 0
+        self.pending_lines = 0
+        self.pending_records = 0
+        self.pending_since = None
+
+    def close(self):
+        if self.fh is None:
+            return
+
+        self.flush()
+        self.fh.close()
+        self.fh = None